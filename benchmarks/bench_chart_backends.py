@@ -0,0 +1,79 @@
+"""Сравнение бэкендов графиков: встроенный растровый против matplotlib
+
+Каждый бэкенд меряется в отдельном процессе: время импорта, задержка отрисовки и пиковая память.
+Запуск из корня проекта: python -m benchmarks.bench_chart_backends
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+from utils.timeseries import DailySeries
+
+BACKENDS = ('raster', 'matplotlib')
+ROUNDS = 30
+
+def make_user() -> dict:
+    history = DailySeries()
+    start = date.today() - timedelta(days=6)
+    for i in range(7):
+        history.set(start + timedelta(days=i), 'water', 1500 + i * 100)
+        history.set(start + timedelta(days=i), 'calories', 1800 + i * 50)
+    return {
+        'history': history, 'water_goal': 2300, 'calorie_goal': 2100,
+        'totals': {'food_count': 3, 'protein': 60, 'carbs': 200, 'fat': 50}
+    }
+
+def measure(func, *args) -> float:
+    func(*args)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(*args)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+def run_backend(name: str) -> dict:
+    """Замеры внутри процесса с одним бэкендом"""
+    from config import config
+    from utils.charts import Charts, get_backend
+    config.CHART_BACKEND = name
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    get_backend()
+    import_ms = (time.perf_counter() - start) * 1000
+
+    user = make_user()
+    result = {
+        'import_ms': import_ms,
+        'water_ms': measure(Charts.create_water_chart, user),
+        'macros_ms': measure(Charts.create_macros_chart, user['totals']),
+        'dashboard_ms': measure(Charts.create_dashboard, user),
+        'png_bytes': len(Charts.create_water_chart(user)),
+    }
+    # ru_maxrss в Linux - в килобайтах
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['rss_mb'] = rss_after / 1024
+    result['rss_growth_mb'] = (rss_after - rss_before) / 1024
+    return result
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(json.dumps(run_backend(sys.argv[1])))
+        sys.exit()
+
+    print(f"{'бэкенд':<12}{'импорт':>10}{'вода':>10}{'БЖУ':>10}{'сводка':>10}{'PNG':>9}{'RSS':>9}{'+RSS':>9}")
+    for backend in BACKENDS:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_chart_backends', backend],
+            capture_output=True, text=True
+        )
+        if output.returncode != 0:
+            print(f"{backend:<12}недоступен: {output.stderr.strip().splitlines()[-1]}")
+            continue
+        r = json.loads(output.stdout)
+        print(
+            f"{backend:<12}{r['import_ms']:>8.0f}мс{r['water_ms']:>8.1f}мс{r['macros_ms']:>8.1f}мс"
+            f"{r['dashboard_ms']:>8.1f}мс{r['png_bytes'] / 1024:>7.1f}КБ"
+            f"{r['rss_mb']:>7.0f}МБ{r['rss_growth_mb']:>7.0f}МБ"
+        )
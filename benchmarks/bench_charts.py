@@ -0,0 +1,73 @@
+"""Сравнение скорости отрисовки графиков: pyplot на каждый вызов против заготовок Figure
+
+Запуск из корня проекта: python -m benchmarks.bench_charts
+"""
+import io
+import time
+import threading
+from datetime import date, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from config import config
+from utils.charts import Charts
+from utils.timeseries import DailySeries
+
+ROUNDS = 30
+
+def make_user() -> dict:
+    history = DailySeries()
+    start = date.today() - timedelta(days=6)
+    for i in range(7):
+        history.set(start + timedelta(days=i), 'water', 1500 + i * 100)
+        history.set(start + timedelta(days=i), 'calories', 1800 + i * 50)
+    return {'history': history, 'water_goal': 2300, 'calorie_goal': 2100}
+
+def pyplot_water_chart(user_data: dict) -> bytes:
+    """Прежний способ: новая фигура через pyplot на каждый вызов"""
+    dates, values = user_data['history'].last(7)
+    fig, ax = plt.subplots(figsize=(8, 4))
+    ax.bar([day.strftime('%d.%m') for day in dates], values['water'], color='lightblue')
+    ax.set_xlabel('Дата')
+    ax.set_ylabel('Вода (мл)')
+    ax.set_title('Потребление воды')
+    ax.axhline(y=user_data['water_goal'], color='red', linestyle='--', alpha=0.5)
+    plt.tight_layout()
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png', dpi=80, bbox_inches='tight')
+    plt.close(fig)
+    return buf.getvalue()
+
+def measure(func, *args) -> float:
+    func(*args)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(*args)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+def measure_threads(func, *args, threads: int = 4) -> float:
+    def worker():
+        for _ in range(ROUNDS):
+            func(*args)
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return (time.perf_counter() - start) / (ROUNDS * threads) * 1000
+
+if __name__ == "__main__":
+    config.CHART_BACKEND = 'matplotlib'
+    user = make_user()
+    totals = {'food_count': 3, 'protein': 60, 'carbs': 200, 'fat': 50}
+
+    baseline = measure(pyplot_water_chart, user)
+    water = measure(Charts.create_water_chart, user)
+    print(f"Вода, pyplot:        {baseline:.1f} мс/график")
+    print(f"Вода, заготовка:     {water:.1f} мс/график (x{baseline / water:.1f})")
+    print(f"Калории, заготовка:  {measure(Charts.create_calories_chart, user):.1f} мс/график")
+    print(f"БЖУ, заготовка:      {measure(Charts.create_macros_chart, totals):.1f} мс/график")
+    print(f"Вода, 4 потока:      {measure_threads(Charts.create_water_chart, user):.1f} мс/график")
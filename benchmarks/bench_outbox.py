@@ -0,0 +1,116 @@
+"""Очередь исходящих сообщений против поддельного Bot API с лимитами Telegram
+
+Сценарий: рассылка напоминаний по многим чатам, через полсекунды - ответы на команды
+в других чатах, и несколько чатов, куда каждые 0.2 с уходит новый текст. Сравниваются
+отправка напрямую и через Outbox: сколько 429 вернул API, сколько сообщений не дошло,
+задержка ответов и напоминаний, порядок сообщений внутри чата. Во втором прогоне лимит
+чата в API строже, чем в настройках бота, - проверка повторов по retry_after.
+
+Запуск из корня проекта: python -m benchmarks.bench_outbox [чатов_рассылки]
+"""
+import asyncio
+import re
+import sys
+import time
+from typing import List
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from benchmarks.fake_bot_api import FakeBotAPI
+from config import config
+from services.outbox import REMINDER, Outbox
+
+INTERACTIVE_CHATS = 20
+BURST_CHATS = 5
+BURST_MESSAGES = 6
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+async def send(bot: Bot, chat_id: int, text: str, latencies: List[float], failures: List[str]):
+    start = time.perf_counter()
+    try:
+        await bot.send_message(chat_id, text)
+        latencies.append(time.perf_counter() - start)
+    except Exception as e:
+        failures.append(type(e).__name__)
+
+async def scenario(use_outbox: bool, api: FakeBotAPI, reminder_chats: int) -> dict:
+    url = await api.start()
+    bot = Bot('42:TEST', session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    outbox = Outbox()
+    if use_outbox:
+        bot.session.middleware(outbox)
+    reminders, replies, bursts, failures = [], [], [], []
+
+    async def broadcast():
+        with outbox.lane(REMINDER):
+            await asyncio.gather(*(
+                send(bot, 1000 + chat, "Напоминание 1", reminders, failures) for chat in range(reminder_chats)
+            ))
+
+    async def interactive():
+        await asyncio.sleep(0.5)
+        await asyncio.gather(*(
+            send(bot, 5000 + chat, "Ответ 1", replies, failures) for chat in range(INTERACTIVE_CHATS)
+        ))
+
+    async def burst():
+        # Каждые 0.2 с - новое сообщение в те же чаты, не дожидаясь отправки предыдущих
+        tasks = []
+        for index in range(1, BURST_MESSAGES + 1):
+            tasks += [
+                asyncio.create_task(send(bot, 9000 + chat, f"Сообщение {index}", bursts, failures))
+                for chat in range(BURST_CHATS)
+            ]
+            await asyncio.sleep(0.2)
+        await asyncio.gather(*tasks)
+
+    start = time.perf_counter()
+    await asyncio.gather(broadcast(), interactive(), burst())
+    elapsed = time.perf_counter() - start
+    if use_outbox:
+        await outbox.stop()
+    await bot.session.close()
+    await api.stop()
+
+    # Номера сообщений в каждом чате должны идти по возрастанию
+    misordered = 0
+    for texts in api.delivered.values():
+        numbers = [int(number) for text in texts for number in re.findall(r'\d+', text)]
+        misordered += numbers != sorted(numbers)
+    return {
+        'elapsed': elapsed,
+        '429': api.stats['429'],
+        'failed': len(failures),
+        'delivered': sum(len(texts) for texts in api.delivered.values()),
+        'reply_p95': percentile(replies, 0.95),
+        'reminder_p95': percentile(reminders, 0.95),
+        'misordered': misordered,
+        'outbox': outbox.get_stats() if use_outbox else None
+    }
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<28} {result['elapsed']:6.2f} с, 429: {result['429']:4d}, не дошло: {result['failed']:4d}, "
+        f"доставлено сообщений: {result['delivered']:4d}, ответы p95 {result['reply_p95'] * 1000:6.0f} мс, "
+        f"напоминания p95 {result['reminder_p95'] * 1000:6.0f} мс, нарушений порядка: {result['misordered']}"
+    )
+    if result['outbox']:
+        print(f"{'':<28} {result['outbox']}")
+
+async def main(reminder_chats: int):
+    sent = reminder_chats + INTERACTIVE_CHATS + BURST_CHATS * BURST_MESSAGES
+    print(f"Отправок: {sent} ({reminder_chats} напоминаний, {INTERACTIVE_CHATS} ответов, "
+          f"{BURST_CHATS}x{BURST_MESSAGES} подряд), лимит бота {config.OUTBOX_GLOBAL_RATE:.0f}/с")
+    report("напрямую", await scenario(False, FakeBotAPI(), reminder_chats))
+    report("через очередь", await scenario(True, FakeBotAPI(), reminder_chats))
+    report("через очередь, строгий API", await scenario(True, FakeBotAPI(chat_rate=0.5, chat_burst=1), reminder_chats))
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
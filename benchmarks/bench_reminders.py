@@ -0,0 +1,83 @@
+"""Напоминания о воде на большом числе пользователей: куча таймеров против обхода всех
+
+Пользователи создаются в памяти (без базы), все подписаны на напоминания, часовые пояса
+подобраны так, что у всех сейчас середина дня. Замеряется: построение кучи при запуске,
+пересчет момента после /log_water, выдача напоминаний тем, кто отстает (бот-заглушка
+без сети), и для сравнения - один проход по всем пользователям, который пришлось бы
+делать каждую минуту без кучи.
+
+Запуск из корня проекта: python -m benchmarks.bench_reminders [пользователей]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from config import config
+from services.hydration_reminders import HydrationReminders
+from utils.storage import storage
+
+class FakeBot:
+    """Бот без сети: только считает отправленные сообщения"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str):
+        self.sent += 1
+
+def make_users(count: int) -> int:
+    """Пользователи с местным временем около 15:00; возвращает, сколько из них отстают от графика"""
+    now = time.time()
+    behind = 0
+    for user_id in range(1, count + 1):
+        # Смещение, при котором местное время - 15:00 плюс-минус час
+        utc_seconds = now % 86400
+        offset = int((15 * 3600 + random.randint(-3600, 3600) - utc_seconds) % 86400)
+        if offset > 12 * 3600:
+            offset -= 86400
+        logged = random.choice([0, 500, 1000, 1500, 2000])
+        storage.users[user_id] = {
+            'water_goal': 2400, 'logged_water': logged, 'utc_offset': offset, 'water_reminders': True
+        }
+        local_now = now + offset
+        if HydrationReminders.expected_ml(2400, local_now) - logged >= config.REMINDER_LAG_ML:
+            behind += 1
+    return behind
+
+async def main(count: int):
+    random.seed(1)
+    behind = make_users(count)
+    print(f"Пользователей: {count}, отстают от графика сейчас: {behind}")
+
+    start = time.perf_counter()
+    await HydrationReminders.start()
+    print(f"Построение кучи при запуске: {(time.perf_counter() - start) * 1000:.0f} мс")
+
+    start = time.perf_counter()
+    sum(1 for user_id in storage.users if storage.get_daily_progress(user_id)['water']['percentage'] < 100)
+    print(f"Один обход всех пользователей (так пришлось бы каждую минуту): {(time.perf_counter() - start) * 1000:.0f} мс")
+
+    sample = random.sample(range(1, count + 1), min(count, 100000))
+    start = time.perf_counter()
+    for user_id in sample:
+        HydrationReminders.reschedule(user_id)
+    per_call = (time.perf_counter() - start) / len(sample) * 1e6
+    print(f"Пересчет после /log_water: {per_call:.1f} мкс, записей в куче: {len(HydrationReminders._heap)}")
+
+    bot = FakeBot()
+    await HydrationReminders.stop()
+    await HydrationReminders.start(bot)
+    start = time.perf_counter()
+    while bot.sent + HydrationReminders.stats['failed'] < behind:
+        await asyncio.sleep(0.01)
+        if time.perf_counter() - start > 120:
+            break
+    elapsed = time.perf_counter() - start
+    print(f"Напоминаний отправлено: {bot.sent} из {behind} за {elapsed:.2f} с ({bot.sent / elapsed:.0f}/с)")
+    due_soon = sum(1 for due in HydrationReminders._due.values() if due <= time.time() + 60)
+    print(f"Следующих напоминаний в ближайшую минуту: {due_soon}, запланировано: {len(HydrationReminders._due)}")
+    await HydrationReminders.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
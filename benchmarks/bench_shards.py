@@ -0,0 +1,106 @@
+"""Пропускная способность при разбиении по воркерам: 1..N процессов на синтетической нагрузке
+
+Для каждого числа воркеров в отдельном процессе с пустым каталогом данных создается общая
+база пользователей (при старте она раскладывается по шардам), запускается ShardRouter,
+и ему передаются обновления /log_water от случайных пользователей. Ответы бота уходят
+в FakeSession и в сеть не отправляются. Время - от первого обновления до остановки всех
+воркеров (все обновления обработаны).
+
+Запуск из корня проекта: python -m benchmarks.bench_shards [макс_воркеров] [обновлений]
+"""
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+USERS = 5000
+
+class FakeSession:
+    """HTTP-сессия бота без сети: каждый метод Bot API считается успешным"""
+
+    def __new__(cls):
+        from aiogram.client.session.base import BaseSession
+
+        class _Session(BaseSession):
+            async def make_request(self, bot, method, timeout=None):
+                return True
+
+            async def stream_content(self, *args, **kwargs):
+                yield b''
+
+            async def close(self):
+                pass
+
+        return _Session()
+
+def fake_update(update_id: int, user_id: int) -> dict:
+    text = f'/log_water {random.randint(100, 500)}'
+    user = {'id': user_id, 'is_bot': False, 'first_name': 'Test'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user,
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len('/log_water')}]
+        }
+    }
+
+def make_users():
+    from config import config
+    from utils.backends import SQLiteBackend
+
+    backend = SQLiteBackend(config.STORAGE_DB)
+    profile = {
+        'weight': 70, 'height': 175, 'age': 30, 'activity': 30, 'gender': 'male',
+        'water_goal': 2400, 'calorie_goal': 2500, 'logged_water': 0, 'logged_calories': 0,
+        'burned_calories': 0, 'food_log': [], 'workout_log': []
+    }
+    backend.save_many((user_id, json.dumps(profile)) for user_id in range(1, USERS + 1))
+    backend.close()
+
+async def run(workers: int, total: int) -> dict:
+    from services.sharding import ShardRouter
+
+    make_users()
+    router = ShardRouter('123456:TEST', workers, session_factory=FakeSession)
+    await router.start()
+    updates = [fake_update(i, random.randint(1, USERS)) for i in range(1, total + 1)]
+    start = time.perf_counter()
+    for raw in updates:
+        await router.route(raw)
+    await router.stop()
+    elapsed = time.perf_counter() - start
+    return {'workers': workers, 'seconds': elapsed, 'rate': total / elapsed, 'routed': router.stats['routed']}
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--run':
+        result = asyncio.run(run(int(sys.argv[2]), int(sys.argv[3])))
+        print(json.dumps(result))
+        sys.exit()
+
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(2, os.cpu_count() or 1)
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    print(f"Ядер: {os.cpu_count()}, обновлений: {total}, пользователей: {USERS}")
+    baseline = None
+    for workers in range(1, max_workers + 1):
+        with tempfile.TemporaryDirectory() as data_dir:
+            # Ответы уходят в FakeSession, лимит Telegram на отправку здесь не нужен
+            env = {**os.environ, 'DATA_DIR': data_dir, 'OPENWEATHER_API_KEY': '', 'OUTBOX_GLOBAL_RATE': '1000000'}
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_shards', '--run', str(workers), str(total)],
+                capture_output=True, text=True, env=env
+            )
+        if output.returncode != 0:
+            print(f"{workers} воркеров: ошибка\n{output.stderr[-2000:]}")
+            break
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        baseline = baseline or result['rate']
+        print(f"{workers} воркеров: {result['rate']:>8.0f} обновлений/с (x{result['rate'] / baseline:.2f}), "
+              f"по шардам: {result['routed']}")
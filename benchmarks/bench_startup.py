@@ -0,0 +1,41 @@
+"""Проверка бюджета запуска: время до готовности принимать обновления
+
+Бот запускается в режиме --startup-report в отдельном процессе с пустым каталогом данных
+несколько раз, берется лучший результат. Если он больше STARTUP_BUDGET_MS, скрипт
+завершается с кодом 1.
+
+Запуск из корня проекта: python -m benchmarks.bench_startup [бюджет_мс]
+"""
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from config import config
+
+RUNS = 3
+
+def measure_startup() -> tuple:
+    """Один запуск: (мс до готовности, полный отчет)"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {**os.environ, 'DATA_DIR': data_dir}
+        result = subprocess.run(
+            [sys.executable, 'bot.py', '--startup-report'],
+            capture_output=True, text=True, env=env
+        )
+    match = re.search(r'готов к приему обновлений\s+([\d.]+)', result.stdout)
+    if result.returncode != 0 or not match:
+        raise RuntimeError(f"Запуск не удался:\n{result.stderr}")
+    return float(match.group(1)), result.stdout
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else config.STARTUP_BUDGET_MS
+    runs = [measure_startup() for _ in range(RUNS)]
+    best, report = min(runs, key=lambda run: run[0])
+
+    print(report)
+    print(f"Запуски: {', '.join(f'{ms:.0f}' for ms, _ in runs)} мс; лучший {best:.0f} мс, бюджет {budget:.0f} мс")
+    if best > budget:
+        print("Бюджет запуска превышен")
+        sys.exit(1)
@@ -0,0 +1,116 @@
+"""Локальный поддельный Bot API с лимитами, как у Telegram
+
+Принимает запросы aiogram по адресу /bot{token}/{method}, отвечает успехом на любой метод,
+а на отправку сообщений - 429 с retry_after, если превышен общий лимит (global_rate в секунду)
+или лимит чата (chat_rate в секунду, подряд не больше chat_burst). Запоминает, какие тексты
+и в каком порядке дошли до каждого чата.
+
+Использование:
+    api = FakeBotAPI()
+    url = await api.start()
+    bot = Bot('42:TEST', session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    ...
+    await api.stop()
+
+Запуск отдельно из корня проекта: python -m benchmarks.fake_bot_api [порт]
+"""
+import asyncio
+import math
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from utils.rate_limit import TokenBucket
+
+SEND_PREFIXES = ('send', 'copy', 'forward', 'edit')
+
+class FakeBotAPI:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1.0, chat_burst: int = 3, latency: float = 0.05):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.latency = latency
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.delivered: Dict[int, List[str]] = defaultdict(list)
+        self.stats = Counter()
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def _limited(self, chat_id: int) -> float:
+        """0, если отправку можно принять, иначе через сколько секунд повторить"""
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        now = time.monotonic()
+        wait = max(bucket.delay(1, now), self.global_bucket.delay(1, now))
+        if wait:
+            return wait
+        bucket.take(1, now)
+        self.global_bucket.take(1, now)
+        return 0
+
+    def _message(self, chat_id: int, text: Optional[str]) -> dict:
+        self._message_id += 1
+        message = {'message_id': self._message_id, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'private'}}
+        if text is not None:
+            message['text'] = text
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        data = await request.post()
+        self.stats[method] += 1
+        await asyncio.sleep(self.latency)
+        if not method.startswith(SEND_PREFIXES) or method == 'sendChatAction' or 'chat_id' not in data:
+            return web.json_response({'ok': True, 'result': True})
+
+        chat_id = int(data['chat_id'])
+        wait = self._limited(chat_id)
+        if wait:
+            self.stats['429'] += 1
+            retry_after = max(1, math.ceil(wait))
+            return web.json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f"Too Many Requests: retry after {retry_after}",
+                'parameters': {'retry_after': retry_after}
+            }, status=429)
+
+        text = data.get('text', data.get('caption'))
+        self.delivered[chat_id].append(text if text is not None else method)
+        if method == 'sendMediaGroup':
+            return web.json_response({'ok': True, 'result': [self._message(chat_id, None)]})
+        return web.json_response({'ok': True, 'result': self._message(chat_id, text)})
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запустить сервер; возвращает адрес для TelegramAPIServer.from_base"""
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def main(port: int):
+    api = FakeBotAPI()
+    url = await api.start(port=port)
+    print(f"Поддельный Bot API: {url} (Ctrl+C - остановить)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+        print(dict(api.stats))
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 8081))
@@ -0,0 +1,56 @@
+"""Отправка поддельных обновлений в вебхук для локальной проверки
+
+Бот запускается с BOT_MODE=webhook и WEBHOOK_SECRET (WEBHOOK_URL можно не указывать),
+скрипт присылает /start от разных пользователей и печатает коды ответов, пропускную способность
+и состояние очереди обработки (503 - очередь переполнена, Telegram прислал бы обновление повторно).
+Ответы бота в Telegram с тестовым токеном не дойдут, это видно в логах как ошибки отправки.
+
+Запуск из корня проекта: python -m benchmarks.post_fake_updates [количество] [параллельность]
+"""
+import asyncio
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+from config import config
+
+def fake_update(update_id: int, text: str = '/start') -> dict:
+    user = {'id': 100000 + update_id % 1000, 'is_bot': False, 'first_name': 'Test'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user['id'], 'type': 'private'},
+            'from': user,
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        }
+    }
+
+async def main(total: int, concurrency: int):
+    url = f"http://127.0.0.1:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}"
+    headers = {'X-Telegram-Bot-Api-Secret-Token': config.WEBHOOK_SECRET}
+    statuses = Counter()
+    queue = iter(range(1, total + 1))
+
+    async def worker(session: aiohttp.ClientSession):
+        for update_id in queue:
+            async with session.post(url, json=fake_update(update_id), headers=headers) as response:
+                statuses[response.status] += 1
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        async with session.get(url.rstrip('/') + '/stats', headers=headers) as response:
+            stats = await response.json()
+    print(f"Отправлено {total} обновлений за {elapsed:.2f} с ({total / elapsed:.0f}/с), ответы: {dict(statuses)}")
+    print(f"Очередь обработки: {stats['pipeline']}")
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(total, concurrency))
@@ -0,0 +1,100 @@
+"""Стресс-проверка обновлений пользователей при высокой конкуренции
+
+Много корутин одновременно увеличивают счетчики небольшого числа пользователей,
+между чтением и записью есть await (как у обработчика, ждущего API):
+
+  - без блокировки           - часть увеличений теряется;
+  - storage.lock(user_id)    - потерь нет;
+  - storage.increment        - потерь нет (метод без await атомарен).
+
+Дополнительно сравнивается время с полосатыми блокировками и с одной общей:
+разные пользователи не должны ждать друг друга.
+Скрипт завершается с кодом 1, если в безопасных вариантах потеряно хотя бы одно обновление.
+
+Запуск из корня проекта: python -m benchmarks.stress_user_locks
+"""
+import asyncio
+import sys
+import time
+
+from utils.storage import UserStorage
+
+USERS = 50
+WORKERS_PER_USER = 40
+INCREMENTS = 25
+
+def make_storage() -> UserStorage:
+    storage = UserStorage()
+    for user_id in range(USERS):
+        storage.create_user(user_id, {'weight': 70})
+    return storage
+
+async def unsafe_increment(storage: UserStorage, user_id: int):
+    value = storage.get_user(user_id)['logged_water']
+    await asyncio.sleep(0)
+    storage.update_user(user_id, {'logged_water': value + 1})
+
+async def locked_increment(storage: UserStorage, user_id: int):
+    async with storage.lock(user_id):
+        await unsafe_increment(storage, user_id)
+
+async def atomic_increment(storage: UserStorage, user_id: int):
+    await asyncio.sleep(0)
+    storage.increment(user_id, 'logged_water', 1)
+
+async def run(step) -> tuple:
+    """(потеряно обновлений, секунд)"""
+    storage = make_storage()
+
+    async def worker(user_id: int):
+        for _ in range(INCREMENTS):
+            await step(storage, user_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        worker(user_id) for user_id in range(USERS) for _ in range(WORKERS_PER_USER)
+    ))
+    elapsed = time.perf_counter() - start
+    expected = WORKERS_PER_USER * INCREMENTS
+    lost = sum(expected - storage.get_user(user_id)['logged_water'] for user_id in range(USERS))
+    return lost, elapsed
+
+async def parallelism(global_lock: bool) -> float:
+    """Время, когда у каждого пользователя критическая секция ждет 10 мс"""
+    storage = make_storage()
+    shared = asyncio.Lock()
+
+    async def handler(user_id: int):
+        async with (shared if global_lock else storage.lock(user_id)):
+            await asyncio.sleep(0.01)
+            storage.increment(user_id, 'logged_water', 1)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler(user_id) for user_id in range(USERS) for _ in range(2)))
+    return time.perf_counter() - start
+
+async def main() -> int:
+    total = USERS * WORKERS_PER_USER * INCREMENTS
+    print(f"Пользователей: {USERS}, корутин: {USERS * WORKERS_PER_USER}, увеличений: {total}")
+    failed = False
+    for name, step, must_be_exact in (
+        ('без блокировки', unsafe_increment, False),
+        ('storage.lock', locked_increment, True),
+        ('storage.increment', atomic_increment, True),
+    ):
+        lost, elapsed = await run(step)
+        print(f"{name:<20} потеряно {lost:>6} ({lost / total:.1%}), {total / elapsed:,.0f} обновлений/с")
+        failed |= must_be_exact and lost != 0
+
+    striped = await parallelism(global_lock=False)
+    shared = await parallelism(global_lock=True)
+    print(f"Секция 10 мс, {USERS} пользователей x 2: полосатые блокировки {striped * 1000:.0f} мс, "
+          f"общая блокировка {shared * 1000:.0f} мс")
+
+    if failed:
+        print("Обнаружены потерянные обновления")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
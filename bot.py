@@ -1,18 +1,9 @@
 import os
+import sys
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
-from aiogram.enums import ParseMode
-from aiogram.client.default import DefaultBotProperties
-from dotenv import load_dotenv
-
-from handlers.start import router as start_router
-from handlers.profile import router as profile_router
-from handlers.water import router as water_router
-from handlers.food import router as food_router
-from handlers.workout import router as workout_router
-from handlers.progress import router as progress_router
-from handlers.stats import router as stats_router
+
+from utils.startup import profiler, import_times, format_import_times
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,8 +11,119 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def create_dispatcher(overflow: str = 'wait'):
+    """Диспетчер с роутерами, очередью обработки обновлений и хуками запуска/остановки
+
+    overflow - что делать при переполненной очереди: 'wait' (притормозить прием) или 'shed' (отказать)
+    """
+    # Импорты внутри функции: процессы пула графиков (spawn) заново импортируют bot.py,
+    # им не нужны aiogram и обработчики
+    with profiler.phase('импорты'):
+        from aiogram import Dispatcher
+        from handlers.start import router as start_router
+        from handlers.profile import router as profile_router
+        from handlers.water import router as water_router
+        from handlers.food import router as food_router
+        from handlers.workout import router as workout_router
+        from handlers.progress import router as progress_router
+        from handlers.stats import router as stats_router
+        from services.food_api import NutritionAPI
+        from services.weather_api import WeatherAPI
+        from services.water_goal_updater import WaterGoalUpdater
+        from services.day_rollover import DayRollover
+        from services.chart_renderer import ChartRenderer
+        from services.warmup import Warmup
+        from services.update_pipeline import UpdatePipeline
+        from services.outbox import outbox
+        from services.hydration_reminders import HydrationReminders
+        from utils.storage import storage
+        from utils.fsm_storage import create_fsm_storage
+        from config import config
+
+    fsm_storage = create_fsm_storage()
+    dp = Dispatcher(storage=fsm_storage)
+    pipeline = UpdatePipeline(
+        concurrency=config.PIPELINE_CONCURRENCY,
+        max_pending=config.PIPELINE_MAX_PENDING,
+        chat_queue_size=config.PIPELINE_CHAT_QUEUE,
+        overflow=overflow
+    )
+    dp.update.outer_middleware(pipeline)
+    dp['pipeline'] = pipeline
+    dp.include_router(start_router)
+    dp.include_router(profile_router)
+    dp.include_router(water_router)
+    dp.include_router(food_router)
+    dp.include_router(workout_router)
+    dp.include_router(progress_router)
+    dp.include_router(stats_router)
+    
+    # До начала приема обновлений - только то, без чего нельзя отвечать пользователям;
+    # тяжелые зависимости прогреваются в фоне (Warmup)
+    dp.startup.register(profiler.timed('загрузка данных', storage.start))
+    if hasattr(fsm_storage, 'start'):
+        dp.startup.register(profiler.timed('хранилище диалогов', fsm_storage.start))
+    dp.startup.register(profiler.timed('обновление погоды', WeatherAPI.start_refresher))
+    dp.startup.register(profiler.timed('обновление норм воды', WaterGoalUpdater.start))
+    dp.startup.register(profiler.timed('смена дня', DayRollover.start))
+    dp.startup.register(profiler.timed('кэш графиков', ChartRenderer.start))
+    dp.startup.register(pipeline.start)
+    dp.startup.register(HydrationReminders.start)
+    dp.startup.register(Warmup.start)
+    dp.startup.register(profiler.mark_ready)
+    # Сначала дорабатываются обновления из очереди, потом останавливается остальное
+    dp.shutdown.register(pipeline.stop)
+    dp.shutdown.register(HydrationReminders.stop)
+    dp.shutdown.register(outbox.stop)
+    dp.shutdown.register(Warmup.stop)
+    dp.shutdown.register(DayRollover.stop)
+    dp.shutdown.register(WaterGoalUpdater.stop)
+    dp.shutdown.register(NutritionAPI.close)
+    dp.shutdown.register(WeatherAPI.close)
+    dp.shutdown.register(ChartRenderer.stop)
+    dp.shutdown.register(storage.close)
+    # aiogram вызывает close хранилища диалогов первым хуком, до доработки очереди: там
+    # только запись накопленного, а базу закрываем сами, последней
+    if hasattr(fsm_storage, 'stop'):
+        dp.shutdown.register(fsm_storage.stop)
+    return dp
+
+async def startup_report():
+    """Отчет о времени запуска: самые долгие импорты, startup-хуки и фоновый прогрев"""
+    from services.warmup import Warmup
+
+    dp = create_dispatcher()
+    await dp.emit_startup()
+    await Warmup.wait()
+    await dp.emit_shutdown()
+
+    print(format_import_times(import_times('import bot; bot.create_dispatcher()')))
+    print()
+    print(profiler.report())
+
+def create_bot(token: str, session=None):
+    """Бот с настройками по умолчанию (session - своя HTTP-сессия, например для тестов)
+
+    Сообщения уходят через очередь исходящих с учетом лимитов Telegram (services.outbox)
+    """
+    from aiogram import Bot
+    from aiogram.enums import ParseMode
+    from aiogram.client.default import DefaultBotProperties
+    from services.outbox import outbox
+
+    bot = Bot(
+        token=token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    bot.session.middleware(outbox)
+    return bot
+
 async def main():
     """Основная функция запуска бота"""
+    from dotenv import load_dotenv
+    from config import config
+
     load_dotenv()
     
     BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -30,25 +132,34 @@ async def main():
         print("Установите переменную окружения BOT_TOKEN")
         return
     
-    bot = Bot(
-        token=BOT_TOKEN, 
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    if config.WORKERS > 1:
+        from services.sharding import ShardRouter
+        logger.info(f"Бот запущен: {config.WORKERS} воркеров по user_id")
+        await ShardRouter(BOT_TOKEN, config.WORKERS).run()
+        return
     
-    dp = Dispatcher()
-    dp.include_router(start_router)
-    dp.include_router(profile_router)
-    dp.include_router(water_router)
-    dp.include_router(food_router)
-    dp.include_router(workout_router)
-    dp.include_router(progress_router)
-    dp.include_router(stats_router)
+    # Если раньше работали с WORKERS > 1, данные в базах шардов: собираем их обратно
+    from services.sharding import split_storage
+    split_storage(1)
+    
+    bot = create_bot(BOT_TOKEN)
+    # Вебхук при переполнении отвечает 503 (Telegram повторит), polling притормаживает прием
+    dp = create_dispatcher(overflow='shed' if config.BOT_MODE == 'webhook' else 'wait')
     
-    logger.info("Бот запущен")
-    await dp.start_polling(bot)
+    if config.BOT_MODE == 'webhook':
+        from services.webhook_server import WebhookServer
+        logger.info("Бот запущен (вебхук)")
+        await WebhookServer(dp, bot).run()
+    else:
+        logger.info("Бот запущен")
+        # Обновления принимаются по одному, параллельность задает очередь обработки
+        await dp.start_polling(bot, handle_as_tasks=False)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if '--startup-report' in sys.argv:
+            asyncio.run(startup_report())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
-        logger.info("Бот остановлен")
\ No newline at end of file
+        logger.info("Бот остановлен")
@@ -6,10 +6,82 @@ load_dotenv()
 class Config:
     BOT_TOKEN = os.getenv("BOT_TOKEN")
     OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
-    
+
     PARSE_MODE = "HTML"
-    
+
+    DATA_DIR = os.getenv("DATA_DIR", "data")
+
     NUTRITION_API_TIMEOUT = 10
+    NUTRITION_API_POOL_SIZE = 100
     WEATHER_API_TIMEOUT = 10
-    
-config = Config()
\ No newline at end of file
+    DEFAULT_TEMPERATURE = 20.0
+    WEATHER_API_POOL_SIZE = 50
+
+    PRODUCT_CACHE_SIZE = 2000
+    PRODUCT_CACHE_TTL = 6 * 3600
+    PRODUCT_CACHE_DISK_TTL = 30 * 24 * 3600
+    PRODUCT_CACHE_DB = os.path.join(DATA_DIR, "products_cache.sqlite")
+
+    FOOD_INDEX_DB = os.path.join(DATA_DIR, "food_index.sqlite")
+    FOOD_INDEX_MIN_SCORE = 0.4
+
+    WEATHER_CACHE_SIZE = 5000
+    WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", 3600))
+    WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", 3 * 3600))
+    WEATHER_REFRESH_INTERVAL = 300
+    WEATHER_HOT_WINDOW = 6 * 3600
+
+    WATER_GOAL_REFRESH_INTERVAL = 3600
+    WEATHER_REFRESH_CONCURRENCY = 10
+
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+    STORAGE_DB = os.path.join(DATA_DIR, "users.sqlite")
+    STORAGE_FLUSH_INTERVAL_MS = 200
+    STORAGE_FLUSH_CHUNK = 500
+    WORKOUT_HISTORY_DAYS = 365
+    USER_LOCK_STRIPES = 1024
+    FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+    FSM_DB = os.path.join(DATA_DIR, "fsm.sqlite")
+    FSM_CACHE_SIZE = 10000
+
+    JOURNAL_DIR = os.path.join(DATA_DIR, "journal")
+    JOURNAL_SNAPSHOT_EVERY = 10000
+
+    DEFAULT_UTC_OFFSET = int(os.getenv("DEFAULT_UTC_OFFSET", 3 * 3600))
+    DAY_ROLLOVER_BATCH_SIZE = 1000
+
+    CHART_WORKERS = int(os.getenv("CHART_WORKERS", 2))
+    CHART_QUEUE_SIZE = 32
+    CHART_TIMEOUT = 10
+    CHART_CACHE_BYTES = 32 * 1024 * 1024
+    CHART_BACKEND = os.getenv("CHART_BACKEND", "raster")
+    BOT_MODE = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_MAX_CONNECTIONS = 40
+    WEBHOOK_DRAIN_TIMEOUT = 30
+    POLLING_TIMEOUT = 30
+    WORKERS = int(os.getenv("WORKERS", 1))
+    WORKER_QUEUE_SIZE = 1000
+    PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", 64))
+    PIPELINE_MAX_PENDING = 5000
+    PIPELINE_CHAT_QUEUE = 20
+    PIPELINE_STATS_INTERVAL = 60
+    OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", 30))
+    OUTBOX_GLOBAL_BURST = 10
+    OUTBOX_CHAT_RATE = 1.0
+    OUTBOX_GROUP_RATE = 20 / 60
+    OUTBOX_CHAT_BURST = 3
+    OUTBOX_MAX_RETRIES = 3
+    REMINDER_START_HOUR = 9
+    REMINDER_END_HOUR = 21
+    REMINDER_LAG_ML = int(os.getenv("REMINDER_LAG_ML", 300))
+    REMINDER_MIN_INTERVAL = 2 * 3600
+    REMINDER_MAX_SENDING = 100
+    STARTUP_BUDGET_MS = int(os.getenv("STARTUP_BUDGET_MS", 3000))
+    DEFAULT_STATS_MODE = os.getenv("DEFAULT_STATS_MODE", "separate")
+
+config = Config()
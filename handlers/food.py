@@ -30,6 +30,9 @@ async def log_food(message: types.Message, state: FSMContext):
         
         nutrition_api = NutritionAPI()
         food_info = await nutrition_api.search_product(product_name)
+        if not food_info:
+            await message.answer(f"Продукт «{product_name}» не найден. Попробуйте другое название.")
+            return
         
         await state.update_data(
             current_food=food_info,
@@ -4,6 +4,7 @@ from aiogram.fsm.context import FSMContext
 
 from states import UserStates
 from keyboards import get_activity_keyboard, get_gender_keyboard
+from services.day_rollover import DayRollover
 from utils.storage import storage
 
 router = Router()
@@ -106,7 +107,11 @@ async def process_gender_callback(callback: types.CallbackQuery, state: FSMConte
     data = await state.get_data()
     calculator = Calculator()
     
+    user_id = callback.from_user.id
+    # Погода и часовой пояс запрашиваются заранее, без блокировки пользователя: дальше await
+    # нет, расчет норм и создание профиля выполняются целиком, без переключения на другие задачи
     temperature = await WeatherAPI.get_temperature(data.get('city', 'Moscow'))
+    utc_offset = await WeatherAPI.get_utc_offset(data.get('city', 'Moscow'))
     
     water_goal = calculator.calculate_water_norm(
         weight=data['weight'],
@@ -122,14 +127,15 @@ async def process_gender_callback(callback: types.CallbackQuery, state: FSMConte
         gender=gender
     )
     
-    user_id = callback.from_user.id
     storage.create_user(user_id, {
         **data,
         'water_goal': water_goal,
         'base_water_goal': water_goal,  
         'calorie_goal': calorie_goal,
-        'temperature': temperature
+        'temperature': temperature,
+        'utc_offset': utc_offset
     })
+    DayRollover.track(user_id)
     
     await state.clear()
     
@@ -159,4 +165,25 @@ async def process_gender_callback(callback: types.CallbackQuery, state: FSMConte
     /check_progress - проверить прогресс
     """
     
-    await callback.message.answer(summary)
\ No newline at end of file
+    await callback.message.answer(summary)
+
+@router.message(Command("set_timezone"))
+async def set_timezone(message: types.Message):
+    """Установить часовой пояс (смещение от UTC в часах)"""
+    user_id = message.from_user.id
+    
+    if not storage.get_user(user_id):
+        await message.answer("Сначала настройте профиль: /set_profile")
+        return
+    
+    try:
+        parts = message.text.split()
+        hours = float(parts[1].replace('UTC', '').replace(',', '.'))
+        if not -12 <= hours <= 14:
+            raise ValueError
+    except (ValueError, IndexError):
+        await message.answer("Использование: /set_timezone смещение от UTC в часах\nПример: /set_timezone +3")
+        return
+    
+    DayRollover.set_offset(user_id, int(hours * 3600))
+    await message.answer(f"Часовой пояс: UTC{hours:+g}. День будет сбрасываться в полночь по местному времени.")
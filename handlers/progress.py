@@ -24,6 +24,8 @@ async def check_progress(message: types.Message):
         await message.answer("Нет данных о прогрессе.")
         return
     
+    totals = storage.get_daily_totals(user_id)
+    
     water = progress['water']
     calories = progress['calories']
     
@@ -47,8 +49,8 @@ async def check_progress(message: types.Message):
     Осталось: {calories['remaining']:.1f} ккал
 
     Статистика:
-    • Приемов пищи: {len(user_data['food_log'])}
-    • Тренировок: {len(user_data['workout_log'])}
+    • Приемов пищи: {totals['food_count']}
+    • Тренировок: {totals['workout_count']}
     """
     
     await message.answer(response)
@@ -83,7 +85,7 @@ async def get_recommendations(message: types.Message):
     
     water_percentage = progress['water']['percentage']
     calorie_percentage = progress['calories']['percentage']
-    has_workout = len(user_data['workout_log']) > 0
+    has_workout = storage.get_daily_totals(user_id)['workout_count'] > 0
     
     recommendations = Helpers.get_recommendations(water_percentage, calorie_percentage, has_workout)
     
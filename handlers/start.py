@@ -28,9 +28,11 @@ async def help_command(message: types.Message):
 
     Профиль:
     /set_profile - Настроить профиль
+    /set_timezone +3 - Указать часовой пояс (UTC+3)
 
     Вода:
     /log_water 500 - Записать 500 мл выпитой воды
+    /reminders вкл - Напоминать о воде, если отстаю от нормы
 
     Питание:
     /log_food банан - Записать съеденный продукт
@@ -41,6 +43,7 @@ async def help_command(message: types.Message):
     Прогресс:
     /check_progress - Показать текущий прогресс
     /stats - Показать статистику
+    /stats_mode панель - Графики одной картинкой (отдельно / альбом / панель)
     /recommend - Получить рекомендации
 
     Утилиты:
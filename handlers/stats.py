@@ -1,15 +1,25 @@
 from aiogram import Router, types
 from aiogram.filters import Command
-from aiogram.types import BufferedInputFile
+from aiogram.types import BufferedInputFile, InputMediaPhoto
+import asyncio
 import logging
-import io
-from datetime import datetime
 
+from config import config
+from services.chart_renderer import ChartRenderer
+from services.outbox import REPORT, outbox
 from utils.storage import storage
 
 logger = logging.getLogger(__name__)
 router = Router()
 
+# Режимы вывода графиков в /stats
+STATS_MODES = {
+    'отдельно': 'separate',
+    'альбом': 'album',
+    'панель': 'dashboard'
+}
+CAPTION_LIMIT = 1024
+
 @router.message(Command("stats"))
 @router.message(Command("statistics"))
 async def show_stats(message: types.Message):
@@ -22,226 +32,101 @@ async def show_stats(message: types.Message):
         return
     
     stats_text = _format_stats_text(user_data)
-    await message.answer(stats_text)
+    mode = user_data.get('stats_mode', config.DEFAULT_STATS_MODE)
+    # В альбоме и сводной картинке текст идет подписью, если укладывается в лимит Telegram
+    caption = stats_text if mode != 'separate' and len(stats_text) <= CAPTION_LIMIT else None
+    if caption is None:
+        await message.answer(stats_text)
     
-    try:
-        # График воды
-        water_image = create_water_chart(user_data)
-        if water_image and len(water_image) > 100:  
-            await message.answer_photo(
-                BufferedInputFile(water_image, filename="water.png"),
-                caption="💧 Потребление воды"
-            )
-        else:
-            logger.warning("Не удалось создать график воды")
-        
-        # График калорий
-        calorie_image = create_calories_chart(user_data)
-        if calorie_image and len(calorie_image) > 100:
-            await message.answer_photo(
-                BufferedInputFile(calorie_image, filename="calories.png"),
-                caption="🔥 Потребление калорий"
-            )
-        else:
-            logger.warning("Не удалось создать график калорий")
-        
-        # График макронутриентов (если есть данные)
-        if user_data.get('food_log'):
-            macro_image = create_macros_chart(user_data['food_log'])
-            if macro_image and len(macro_image) > 100:
-                await message.answer_photo(
-                    BufferedInputFile(macro_image, filename="macros.png"),
-                    caption="🍎 Макронутриенты"
-                )
-        
-    except Exception as e:
-        logger.error(f"Ошибка при создании графиков: {e}", exc_info=True)
-        await message.answer("⚠️ Графики временно недоступны. Используйте текстовую статистику.")
-
-def create_water_chart(user_data: dict) -> bytes:
-    """Создать простой график воды"""
-    try:
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        
-        fig, ax = plt.subplots(figsize=(8, 4))
-        
-        water_history = user_data.get('water_history', {})
-        if isinstance(water_history, list):
-            water_dict = {}
-            for entry in water_history[-7:]:
-                if isinstance(entry, dict):
-                    water_dict[entry.get('date', '')] = entry.get('amount', 0)
-            water_history = water_dict
+    # Графики - отчет: уступают очередь отправки ответам на команды других пользователей
+    with outbox.lane(REPORT):
+        try:
+            chart_data = {
+                'history': user_data.get('history'),
+                'water_goal': user_data.get('water_goal'),
+                'calorie_goal': user_data.get('calorie_goal')
+            }
+            totals = storage.get_daily_totals(user_id)
         
-        if water_history:
-            dates = sorted(water_history.keys())[-7:]
-            amounts = [water_history[date] for date in dates]
-            
-            simple_dates = []
-            for date_str in dates:
-                try:
-                    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                    simple_dates.append(date_obj.strftime('%d.%m'))
-                except:
-                    simple_dates.append(date_str[:5])
-            
-            ax.bar(simple_dates, amounts, color='lightblue')
-            ax.set_xlabel('Дата')
-            ax.set_ylabel('Вода (мл)')
-            ax.set_title('Потребление воды')
-            
-            goal = user_data.get('water_goal')
-            if goal:
-                ax.axhline(y=goal, color='red', linestyle='--', alpha=0.5)
+            if mode == 'dashboard':
+                dashboard_image = await ChartRenderer.render('dashboard', {**chart_data, 'totals': totals}, user_id)
+                if dashboard_image and len(dashboard_image) > 100:
+                    await message.answer_photo(
+                        BufferedInputFile(dashboard_image, filename="dashboard.png"),
+                        caption=caption
+                    )
+                else:
+                    logger.warning("Не удалось создать сводный график")
+                    if caption:
+                        await message.answer(stats_text)
+                return
         
-        else:
-            ax.text(0.5, 0.5, 'Нет данных о воде', 
-                   ha='center', va='center', fontsize=14)
+            # Графики рисуются параллельно в пуле процессов, не блокируя других пользователей
+            water_image, calorie_image, macro_image = await asyncio.gather(
+                ChartRenderer.render('water', chart_data, user_id),
+                ChartRenderer.render('calories', chart_data, user_id),
+                ChartRenderer.render('macros', totals, user_id) if totals['food_count'] else asyncio.sleep(0, b'')
+            )
+            images = [
+                (water_image, "water.png", "💧 Потребление воды"),
+                (calorie_image, "calories.png", "🔥 Потребление калорий"),
+                (macro_image, "macros.png", "🍎 Макронутриенты")
+            ]
+            images = [(image, filename, title) for image, filename, title in images if image and len(image) > 100]
         
-        plt.tight_layout()
+            if mode == 'album':
+                if not images:
+                    logger.warning("Не удалось создать графики")
+                    if caption:
+                        await message.answer(stats_text)
+                    return
+                if len(images) == 1:
+                    # Альбом в Telegram - от двух медиа
+                    image, filename, _ = images[0]
+                    await message.answer_photo(BufferedInputFile(image, filename=filename), caption=caption)
+                    return
+                # Один альбом вместо нескольких сообщений
+                media = [
+                    InputMediaPhoto(
+                        media=BufferedInputFile(image, filename=filename),
+                        caption=caption if index == 0 else None
+                    )
+                    for index, (image, filename, _) in enumerate(images)
+                ]
+                await message.answer_media_group(media)
+                return
         
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=80, bbox_inches='tight')
-        buf.seek(0)
-        result = buf.getvalue()
-        plt.close(fig)
-        return result
+            for image, filename, title in images:
+                await message.answer_photo(BufferedInputFile(image, filename=filename), caption=title)
+            if len(images) < 2:
+                logger.warning("Не удалось создать графики воды или калорий")
         
-    except Exception as e:
-        print(f"Ошибка при создании графика воды: {e}")
-        return b''
+        except Exception as e:
+            logger.error(f"Ошибка при создании графиков: {e}", exc_info=True)
+            await message.answer("⚠️ Графики временно недоступны. Используйте текстовую статистику.")
 
-def create_calories_chart(user_data: dict) -> bytes:
-    """Создать простой график калорий"""
-    try:
-        # Импорты внутри функции для изоляции
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        
-        fig, ax = plt.subplots(figsize=(8, 4))
-        
-        calorie_history = user_data.get('calorie_history', {})
-        processed_data = {}
-        
-        if isinstance(calorie_history, list):
-            recent_entries = calorie_history[-7:] if calorie_history else []
-            for entry in recent_entries:
-                if isinstance(entry, dict):
-                    date_val = entry.get('date', '')
-                    calories_val = entry.get('calories', 0)
-                    if date_val:
-                        processed_data[date_val] = calories_val
-        elif isinstance(calorie_history, dict):
-            sorted_dates = sorted(calorie_history.keys())
-            recent_dates = sorted_dates[-7:] if sorted_dates else []
-            for date in recent_dates:
-                processed_data[date] = calorie_history.get(date, 0)
-        
-        if processed_data:
-            dates = sorted(processed_data.keys())
-            calories = [processed_data[date] for date in dates]
-            
-            formatted_dates = []
-            for date_str in dates:
-                try:
-                    date_obj = datetime.strptime(str(date_str), '%Y-%m-%d')
-                    formatted_dates.append(date_obj.strftime('%d.%m'))
-                except (ValueError, TypeError):
-                    formatted_dates.append(str(date_str)[:5])
-            
-            ax.bar(formatted_dates, calories, color='orange', alpha=0.7)
-            ax.set_xlabel('Дата')
-            ax.set_ylabel('Калории (ккал)')
-            ax.set_title('Потребление калорий')
-            
-            goal = user_data.get('calorie_goal')
-            if goal and isinstance(goal, (int, float)):
-                ax.axhline(y=goal, color='red', linestyle='--', alpha=0.5, 
-                        label=f'Цель: {goal} ккал')
-                ax.legend()
-            
-            plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
-            
-        else:
-            # Нет данных
-            ax.text(0.5, 0.5, 'Нет данных о калориях', 
-                ha='center', va='center', fontsize=14, 
-                transform=ax.transAxes)
-            ax.set_xticks([])
-            ax.set_yticks([])
-        
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=80, bbox_inches='tight')
-        buf.seek(0)
-        result = buf.getvalue()
-        plt.close(fig)
-        
-        return result
+@router.message(Command("stats_mode"))
+async def set_stats_mode(message: types.Message):
+    """Выбрать режим вывода графиков в /stats"""
+    user_id = message.from_user.id
     
-    except Exception as e:
-        print(f"Ошибка при создании графика калорий: {e}")
-        import traceback
-        traceback.print_exc()
-        return b''
-
-def create_macros_chart(food_log: list) -> bytes:
-    """Создать простой график макронутриентов"""
-    try:
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        
-        fig, ax = plt.subplots(figsize=(6, 6))
-        
-        if not food_log:
-            ax.text(0.5, 0.5, 'Нет данных\nо питании', 
-                   ha='center', va='center', fontsize=14)
-            ax.axis('off')
-        else:
-            protein = sum(food.get('protein', 0) for food in food_log)
-            carbs = sum(food.get('carbs', 0) for food in food_log)
-            fat = sum(food.get('fat', 0) for food in food_log)
-            
-            labels = ['Белки', 'Углеводы', 'Жиры']
-            sizes = [protein, carbs, fat]
-            colors = ['lightgreen', 'gold', 'lightcoral']
-            
-            filtered_labels = []
-            filtered_sizes = []
-            filtered_colors = []
-            
-            for label, size, color in zip(labels, sizes, colors):
-                if size > 0:
-                    filtered_labels.append(label)
-                    filtered_sizes.append(size)
-                    filtered_colors.append(color)
-            
-            if filtered_sizes:
-                ax.pie(filtered_sizes, labels=filtered_labels, colors=filtered_colors,
-                      autopct='%1.1f%%', startangle=90)
-                ax.set_title('Макронутриенты')
-            else:
-                ax.text(0.5, 0.5, 'Нет данных\nо макронутриентах', 
-                       ha='center', va='center', fontsize=14)
-                ax.axis('off')
-        
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=80, bbox_inches='tight')
-        buf.seek(0)
-        result = buf.getvalue()
-        plt.close(fig)
-        return result
-        
-    except Exception as e:
-        print(f"Ошибка при создании графика макронутриентов: {e}")
-        return b''
+    if not storage.get_user(user_id):
+        await message.answer("Сначала настройте профиль: /set_profile")
+        return
+    
+    parts = message.text.split()
+    mode_name = parts[1].lower() if len(parts) > 1 else ''
+    if mode_name not in STATS_MODES:
+        await message.answer(
+            "Использование: /stats_mode режим\n"
+            "• отдельно - текст и каждый график отдельным сообщением\n"
+            "• альбом - все графики одним альбомом\n"
+            "• панель - одна сводная картинка"
+        )
+        return
+    
+    storage.update_user(user_id, {'stats_mode': STATS_MODES[mode_name]})
+    await message.answer(f"Режим статистики: {mode_name}")
 
 def _format_stats_text(user_data: dict) -> str:
     """Форматировать текстовую статистику"""
@@ -266,13 +151,10 @@ def _format_stats_text(user_data: dict) -> str:
     water_progress = (water_today / water_goal * 100) if water_goal > 0 else 0
     calorie_progress = (balance_today / calorie_goal * 100) if calorie_goal > 0 else 0
     
-    # Логи еды и тренировок
-    food_log = user_data.get('food_log', [])
-    workout_log = user_data.get('workout_log', [])
-    
-    # Статистика питания
-    food_stats = _calculate_food_stats(food_log)
-    workout_stats = _calculate_workout_stats(workout_log)
+    # Итоги питания и тренировок за день
+    totals = user_data.get('daily_totals') or storage.empty_totals()
+    food_stats = _calculate_food_stats(totals)
+    workout_stats = _calculate_workout_stats(totals)
     
     # История (последние 3 дня)
     history_text = _format_history(user_data)
@@ -301,50 +183,33 @@ def _format_stats_text(user_data: dict) -> str:
 {'⚠️ Превышение!' if balance_today > calorie_goal else '✅ В норме' if balance_today <= calorie_goal else ''}
 
 🍎 **Питание:**
-• Приемов пищи: {len(food_log)}
+• Приемов пищи: {totals['food_count']}
 • Всего калорий: {food_stats['total_calories']:.0f} ккал
 • Белки: {food_stats['total_protein']:.1f} г
 • Углеводы: {food_stats['total_carbs']:.1f} г
 • Жиры: {food_stats['total_fat']:.1f} г
 
 🏃‍♂️ **Тренировки:**
-• Количество: {len(workout_log)}
+• Количество: {totals['workout_count']}
 • Общее время: {workout_stats['total_minutes']} мин
 • Сожжено калорий: {workout_stats['total_calories']:.0f} ккал
 
 {history_text}
 
 💡 **Рекомендации:**
-{_get_recommendations(water_progress, calorie_progress, len(workout_log))}
+{_get_recommendations(water_progress, calorie_progress, totals['workout_count'])}
 """
 
 def _format_history(user_data: dict) -> str:
     """Форматировать историю"""
-    water_history = user_data.get('water_history', {})
-    calorie_history = user_data.get('calorie_history', {})
+    history = user_data.get('history')
+    dates, values = history.last(3) if history else ([], {})  # Последние 3 дня
     
-    if not water_history and not calorie_history:
+    if not dates:
         return "📅 **История:**\nНет данных за предыдущие дни."
     
-    # Преобразуем историю воды
-    water_items = []
-    if isinstance(water_history, dict):
-        for date, amount in list(water_history.items())[-3:]:  # Последние 3 дня
-            water_items.append(f"  {date}: {amount} мл")
-    elif isinstance(water_history, list):
-        for entry in water_history[-3:]:
-            if isinstance(entry, dict):
-                water_items.append(f"  {entry.get('date', '')}: {entry.get('amount', 0)} мл")
-    
-    # Преобразуем историю калорий
-    calorie_items = []
-    if isinstance(calorie_history, dict):
-        for date, calories in list(calorie_history.items())[-3:]:
-            calorie_items.append(f"  {date}: {calories} ккал")
-    elif isinstance(calorie_history, list):
-        for entry in calorie_history[-3:]:
-            if isinstance(entry, dict):
-                calorie_items.append(f"  {entry.get('date', '')}: {entry.get('calories', 0)} ккал")
+    water_items = [f"  {day.isoformat()}: {amount:.0f} мл" for day, amount in zip(dates, values['water'])]
+    calorie_items = [f"  {day.isoformat()}: {calories:.0f} ккал" for day, calories in zip(dates, values['calories'])]
     
     history_text = "📅 **История (последние 3 дня):**\n"
     if water_items:
@@ -381,40 +246,18 @@ def _get_recommendations(water_progress: float, calorie_progress: float, workout
     
     return "\n".join(recommendations) if recommendations else "• Продолжайте в том же духе!"
 
-def _calculate_food_stats(food_log: list) -> dict:
-    """Рассчитать статистику питания"""
-    if not food_log:
-        return {
-            'total_calories': 0,
-            'total_protein': 0,
-            'total_carbs': 0,
-            'total_fat': 0
-        }
-    
-    total_calories = sum(food.get('calories', 0) for food in food_log)
-    total_protein = sum(food.get('protein', 0) for food in food_log)
-    total_carbs = sum(food.get('carbs', 0) for food in food_log)
-    total_fat = sum(food.get('fat', 0) for food in food_log)
-    
+def _calculate_food_stats(totals: dict) -> dict:
+    """Статистика питания из дневных итогов"""
     return {
-        'total_calories': total_calories,
-        'total_protein': total_protein,
-        'total_carbs': total_carbs,
-        'total_fat': total_fat
+        'total_calories': totals['calories'],
+        'total_protein': totals['protein'],
+        'total_carbs': totals['carbs'],
+        'total_fat': totals['fat']
     }
 
-def _calculate_workout_stats(workout_log: list) -> dict:
-    """Рассчитать статистику тренировок"""
-    if not workout_log:
-        return {
-            'total_minutes': 0,
-            'total_calories': 0
-        }
-    
-    total_minutes = sum(workout.get('duration', 0) for workout in workout_log)
-    total_calories = sum(workout.get('calories', 0) for workout in workout_log)
-    
+def _calculate_workout_stats(totals: dict) -> dict:
+    """Статистика тренировок из дневных итогов"""
     return {
-        'total_minutes': total_minutes,
-        'total_calories': total_calories
+        'total_minutes': totals['workout_minutes'],
+        'total_calories': totals['workout_calories']
     }
\ No newline at end of file
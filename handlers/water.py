@@ -1,6 +1,7 @@
 from aiogram import Router, types
 from aiogram.filters import Command
 
+from services.hydration_reminders import HydrationReminders
 from utils.storage import storage
 
 router = Router()
@@ -26,10 +27,9 @@ async def log_water(message: types.Message):
             await message.answer("Пожалуйста, введите положительное количество воды.")
             return
         
-        storage.update_user(user_id, {'logged_water': user_data.get('logged_water', 0) + amount})
+        water_total = storage.add_water(user_id, amount)
         
         user_data = storage.get_user(user_id)
-        water_total = user_data.get('logged_water', 0)
         water_goal = user_data.get('water_goal', 2000)
         
         remaining = max(0, water_goal - water_total)
@@ -44,4 +44,35 @@ async def log_water(message: types.Message):
         await message.answer(response)
         
     except (ValueError, IndexError):
-        await message.answer("Использование: /log_water <количество в мл>\nПример: /log_water 500")
\ No newline at end of file
+        await message.answer("Использование: /log_water <количество в мл>\nПример: /log_water 500")
+
+REMINDER_SWITCH = {'вкл': True, 'on': True, 'выкл': False, 'off': False}
+
+@router.message(Command("reminders"))
+async def toggle_reminders(message: types.Message):
+    """Включить или выключить напоминания о воде"""
+    user_id = message.from_user.id
+    user_data = storage.get_user(user_id)
+    
+    if not user_data:
+        await message.answer("Сначала настройте профиль: /set_profile")
+        return
+    
+    parts = message.text.split()
+    if len(parts) < 2 or parts[1].lower() not in REMINDER_SWITCH:
+        state = "включены" if user_data.get('water_reminders') else "выключены"
+        await message.answer(
+            f"Напоминания о воде {state}.\n"
+            "Использование: /reminders вкл или /reminders выкл"
+        )
+        return
+    
+    enabled = REMINDER_SWITCH[parts[1].lower()]
+    HydrationReminders.set_enabled(user_id, enabled)
+    if enabled:
+        await message.answer(
+            "Напоминания о воде включены: напомню, если к этому времени дня "
+            "вы заметно отстаете от нормы. Выключить: /reminders выкл"
+        )
+    else:
+        await message.answer("Напоминания о воде выключены.")
@@ -48,11 +48,12 @@ async def process_workout_duration(message: types.Message, state: FSMContext):
         
         user_id = message.from_user.id
         user_data = storage.get_user(user_id)
-        
         if not user_data:
             await message.answer("Сначала настройте профиль: /set_profile")
             return
         
+        # Дальше до ответа await нет: запись тренировки и пересчет нормы выполняются целиком,
+        # без storage.lock
         calculator = Calculator()
         burned_calories = calculator.calculate_workout_calories(
             workout_type, duration, user_data['weight']
@@ -74,36 +75,14 @@ async def process_workout_duration(message: types.Message, state: FSMContext):
         # Обновляем норму воды с учетом тренировки
         if additional_water > 0:
             current_water_goal = user_data.get('water_goal', 2000)
-            base_activity = user_data.get('activity', 45) 
-            
-            # Рассчитываем базовую норму воды
-            temperature = user_data.get('temperature', 20.0)
-            base_water_goal = calculator.calculate_water_norm(
-                weight=user_data['weight'],
-                activity_minutes=base_activity,
-                temperature=temperature
-            )
-            
-            # Суммируем дополнительную воду за все сегодняшние тренировки
-            total_additional_water = 0
-            today = datetime.now().strftime('%Y-%m-%d')
-            
-            # Все тренировки за сегодня
-            for workout in storage.get_user(user_id).get('workout_log', []):
-                workout_date = workout.get('date', '')
-                if today in workout_date:  
-                    total_additional_water += workout.get('additional_water', 0)
-            
-            new_water_goal = base_water_goal + total_additional_water
-            
-            storage.update_user(user_id, {'water_goal': new_water_goal})
-            
+            new_water_goal = storage.update_water_goal_with_workouts(user_id, calculator)
+        
             logger.info(f"Обновлена норма воды: {current_water_goal} -> {new_water_goal} мл (+{additional_water} мл за тренировку)")
         
+        total_burned = storage.get_user(user_id)['burned_calories']
+        
         await state.clear()
         
-        user_data = storage.get_user(user_id)
-        total_burned = user_data['burned_calories']
         response = f"""
         Тренировка добавлена!
 
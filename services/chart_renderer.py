@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+from config import config
+from utils.chart_cache import ChartCache
+
+logger = logging.getLogger(__name__)
+
+def _warm_up():
+    """Инициализация процесса: загрузка бэкенда графиков (для matplotlib - и кэша шрифтов)"""
+    from utils.charts import Charts
+    Charts.create_macros_chart({'food_count': 1, 'protein': 1, 'carbs': 1, 'fat': 1})
+
+def _ping() -> bool:
+    return True
+
+def _render(kind: str, payload: Any) -> bytes:
+    """Отрисовка графика в процессе пула"""
+    from utils.charts import Charts
+    if kind == 'water':
+        return Charts.create_water_chart(payload)
+    if kind == 'calories':
+        return Charts.create_calories_chart(payload)
+    if kind == 'macros':
+        return Charts.create_macros_chart(payload)
+    if kind == 'dashboard':
+        return Charts.create_dashboard(payload)
+    raise ValueError(f"Неизвестный тип графика: {kind}")
+
+class ChartRenderer:
+    """Отрисовка графиков в пуле процессов, чтобы не блокировать цикл событий"""
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _pending = 0
+    cache = ChartCache(config.CHART_CACHE_BYTES)
+
+    @staticmethod
+    def chart_inputs(kind: str, payload: Any) -> tuple:
+        """Точные входные данные графика: последние 7 дней и цель либо итоги БЖУ"""
+        if kind == 'dashboard':
+            return (
+                ChartRenderer.chart_inputs('water', payload),
+                ChartRenderer.chart_inputs('calories', payload),
+                ChartRenderer.chart_inputs('macros', payload.get('totals') or {})
+            )
+        if kind == 'macros':
+            return (bool(payload.get('food_count')), payload.get('protein'), payload.get('carbs'), payload.get('fat'))
+        history = payload.get('history')
+        dates, values = history.last(7) if history else ([], {})
+        metric = 'water' if kind == 'water' else 'calories'
+        goal = payload.get('water_goal' if kind == 'water' else 'calorie_goal')
+        return (tuple(day.toordinal() for day in dates), tuple(values.get(metric, ())), goal)
+
+    @classmethod
+    def _get_executor(cls) -> ProcessPoolExecutor:
+        if cls._executor is None:
+            cls._executor = ProcessPoolExecutor(
+                max_workers=config.CHART_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_up
+            )
+        return cls._executor
+
+    @classmethod
+    def _drop_executor(cls, executor: ProcessPoolExecutor, error: BaseException):
+        """Сломанный пул (процесс умер или упал _warm_up) больше не принимает задачи:
+        выбрасываем его, следующий вызов создаст новый"""
+        logger.error(f"Пул отрисовки графиков сломан, будет создан заново: {error}")
+        if cls._executor is executor:
+            cls._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    async def start(cls):
+        """Подключить сброс кэша к изменениям данных (вызывается при старте бота)"""
+        from utils.storage import storage
+        # Изменение данных пользователя сбрасывает его закэшированные графики
+        storage.add_change_listener(cls.cache.invalidate_user)
+
+    @classmethod
+    async def warm_up(cls):
+        """Запустить и прогреть процессы пула (в фоне, после начала приема обновлений)"""
+        loop = asyncio.get_running_loop()
+        executor = cls._get_executor()
+        try:
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, _ping) for _ in range(config.CHART_WORKERS)
+            ))
+        except BrokenProcessPool as e:
+            cls._drop_executor(executor, e)
+            raise
+        logger.info(f"Пул отрисовки графиков запущен: {config.CHART_WORKERS} процессов")
+
+    @classmethod
+    async def stop(cls):
+        """Остановить пул"""
+        if cls._executor is not None:
+            executor, cls._executor = cls._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    @classmethod
+    def get_stats(cls) -> dict:
+        return {
+            'pending': cls._pending,
+            'max_pending': config.CHART_QUEUE_SIZE,
+            'cache_bytes': cls.cache.size,
+            **cls.cache.stats
+        }
+
+    @classmethod
+    async def render(cls, kind: str, payload: Any, user_id: Optional[int] = None) -> bytes:
+        """Отрисовать график ('water', 'calories', 'macros', 'dashboard'); b'' при перегрузке, таймауте или ошибке"""
+        key = ChartCache.digest(kind, cls.chart_inputs(kind, payload))
+        image = cls.cache.get(key)
+        if image is not None:
+            return image
+
+        image = await cls._render_in_pool(kind, payload)
+        if len(image) > 100:
+            cls.cache.put(key, image, user_id)
+        return image
+
+    @classmethod
+    async def _render_in_pool(cls, kind: str, payload: Any) -> bytes:
+        if cls._pending >= config.CHART_QUEUE_SIZE:
+            logger.warning(f"Очередь отрисовки графиков переполнена ({cls._pending})")
+            return b''
+
+        loop = asyncio.get_running_loop()
+        executor = cls._get_executor()
+        try:
+            job = executor.submit(_render, kind, payload)
+        except BrokenProcessPool as e:
+            cls._drop_executor(executor, e)
+            return b''
+        except Exception as e:
+            logger.error(f"Ошибка при отрисовке графика {kind}: {e}")
+            return b''
+        # Место в очереди освобождается, когда процесс действительно закончил работу:
+        # по таймауту ждать перестаем, но начатая отрисовка продолжает занимать процесс
+        cls._pending += 1
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(cls._release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job), timeout=config.CHART_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Превышено время отрисовки графика {kind}")
+            return b''
+        except BrokenProcessPool as e:
+            cls._drop_executor(executor, e)
+            return b''
+        except Exception as e:
+            logger.error(f"Ошибка при отрисовке графика {kind}: {e}")
+            return b''
+
+    @classmethod
+    def _release(cls):
+        cls._pending -= 1
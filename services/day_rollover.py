@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Optional, Set
+from config import config
+from utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+class DayRollover:
+    """Автоматическая смена дня в полночь по местному времени пользователя
+
+    Пользователи сгруппированы по смещению от UTC, на каждую группу - один таймер.
+    В полночь группа обрабатывается пачками: день сохраняется в историю,
+    дневные счетчики сбрасываются.
+    """
+
+    _groups: Dict[int, Set[int]] = {}
+    _user_offsets: Dict[int, int] = {}
+    _tasks: Dict[int, asyncio.Task] = {}
+    _started = False
+
+    @staticmethod
+    def get_offset(user_data: Dict) -> int:
+        """Смещение пользователя от UTC в секундах"""
+        return storage.utc_offset(user_data)
+
+    @staticmethod
+    def local_day(offset: int, now: Optional[datetime] = None) -> date:
+        """Текущая дата по местному времени"""
+        return storage.local_day(offset, now)
+
+    @staticmethod
+    def seconds_until_midnight(offset: int) -> float:
+        """Секунд до ближайшей местной полуночи"""
+        now = datetime.now(timezone.utc)
+        local_now = now + timedelta(seconds=offset)
+        next_midnight = datetime.combine(local_now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+        return (next_midnight - local_now).total_seconds()
+
+    @classmethod
+    def track(cls, user_id: int):
+        """Добавить пользователя в группу его часового пояса (или перенести в новую)"""
+        user_data = storage.get_user(user_id)
+        if not user_data:
+            return
+        offset = cls.get_offset(user_data)
+
+        previous = cls._user_offsets.get(user_id)
+        if previous is not None and previous != offset:
+            cls._groups.get(previous, set()).discard(user_id)
+        cls._user_offsets[user_id] = offset
+        cls._groups.setdefault(offset, set()).add(user_id)
+
+        if 'day_started' not in user_data:
+            storage.update_user(user_id, {'day_started': cls.local_day(offset).isoformat()})
+
+        if cls._started and offset not in cls._tasks:
+            cls._tasks[offset] = asyncio.create_task(cls._timer(offset))
+
+    @classmethod
+    def set_offset(cls, user_id: int, offset: int):
+        """Сменить часовой пояс пользователя и перенести его в группу нового пояса
+
+        При переезде на запад местная дата может оказаться раньше day_started: тогда
+        день продолжается под новой датой, иначе следующая смена дня была бы пропущена.
+        При переезде на восток уже наступивший по новому времени день сменяется сразу.
+        """
+        user_data = storage.get_user(user_id)
+        if not user_data:
+            return
+        updates = {'utc_offset': offset}
+        local_day = cls.local_day(offset).isoformat()
+        if user_data.get('day_started', '') > local_day:
+            updates['day_started'] = local_day
+        storage.update_user(user_id, updates)
+        cls.track(user_id)
+        cls.rollover_user(user_id, cls.local_day(offset))
+
+    @classmethod
+    def rollover_user(cls, user_id: int, new_day: date) -> bool:
+        """Закрыть прошедший день пользователя; False, если день уже сменен"""
+        user_data = storage.get_user(user_id)
+        if not user_data:
+            return False
+        started = user_data.get('day_started')
+        if started and started >= new_day.isoformat():
+            return False
+
+        ended_day = started or (new_day - timedelta(days=1)).isoformat()
+        storage.reset_daily_data(user_id, today=ended_day)
+
+        updates = {'day_started': new_day.isoformat()}
+        if 'base_water_goal' in user_data:
+            # Добавки за тренировки относятся к прошедшему дню
+            updates['water_goal'] = user_data['base_water_goal']
+        storage.update_user(user_id, updates)
+        return True
+
+    @classmethod
+    async def rollover_group(cls, offset: int) -> int:
+        """Сменить день всем пользователям часового пояса, пачками без блокировки цикла событий"""
+        new_day = cls.local_day(offset)
+        user_ids = list(cls._groups.get(offset, ()))
+        batch_size = config.DAY_ROLLOVER_BATCH_SIZE
+        rolled = 0
+        for start in range(0, len(user_ids), batch_size):
+            for user_id in user_ids[start:start + batch_size]:
+                try:
+                    if cls.rollover_user(user_id, new_day):
+                        rolled += 1
+                except Exception as e:
+                    logger.error(f"Ошибка смены дня для пользователя {user_id}: {e}")
+            await asyncio.sleep(0)
+        if rolled:
+            logger.info(f"Смена дня (UTC{offset / 3600:+g}): {rolled} пользователей")
+        return rolled
+
+    @classmethod
+    async def _timer(cls, offset: int):
+        """Таймер часового пояса: ждать местной полуночи и сменить день группе"""
+        while True:
+            await asyncio.sleep(cls.seconds_until_midnight(offset) + 1)
+            try:
+                await cls.rollover_group(offset)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка смены дня (UTC{offset / 3600:+g}): {e}")
+
+    @classmethod
+    async def start(cls):
+        """Сгруппировать пользователей, догнать пропущенные смены дня и запустить таймеры"""
+        for user_id in list(storage.users):
+            cls.track(user_id)
+        # Если бот был выключен в полночь, день сменится сразу
+        for offset in list(cls._groups):
+            await cls.rollover_group(offset)
+
+        cls._started = True
+        for offset in cls._groups:
+            if offset not in cls._tasks:
+                cls._tasks[offset] = asyncio.create_task(cls._timer(offset))
+
+    @classmethod
+    async def stop(cls):
+        """Остановить таймеры"""
+        cls._started = False
+        tasks = list(cls._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cls._tasks.clear()
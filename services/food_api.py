@@ -1,31 +1,154 @@
-import requests
+import os
+import asyncio
+import aiohttp
 import logging
 from typing import Optional, Dict
+from config import config
+from services.food_index import FoodIndex
+from utils.cache import LRUCache, SQLiteCache, TwoTierCache
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 class NutritionAPI:
     """Класс для работы с API пищевых продуктов"""
-    
+
+    SEARCH_URL = "https://world.openfoodfacts.org/cgi/search.pl"
+
+    _session: Optional[aiohttp.ClientSession] = None
+    _cache: Optional[TwoTierCache] = None
+    _index_task: Optional[asyncio.Task] = None
+    _flight = SingleFlight()
+
+    @staticmethod
+    def normalize_query(product_name: str) -> str:
+        """Нормализация названия продукта для ключа кэша"""
+        return FoodIndex.normalize_name(product_name)
+
+    @staticmethod
+    def _load_index() -> Optional[FoodIndex]:
+        if not config.FOOD_INDEX_DB or not os.path.exists(config.FOOD_INDEX_DB):
+            return None
+        try:
+            return FoodIndex.load(config.FOOD_INDEX_DB)
+        except Exception as e:
+            logger.error(f"Не удалось загрузить индекс продуктов: {e}")
+            return None
+
+    @classmethod
+    async def get_index(cls) -> Optional[FoodIndex]:
+        """Локальный индекс продуктов (если он был построен)
+
+        Загружается один раз в отдельном потоке; одновременные вызовы ждут одну и ту же
+        загрузку. shield - чтобы отмена одного из ждущих не прервала загрузку для остальных.
+        """
+        if cls._index_task is None:
+            cls._index_task = asyncio.create_task(asyncio.to_thread(cls._load_index))
+        return await asyncio.shield(cls._index_task)
+
+    @classmethod
+    def get_cache(cls) -> TwoTierCache:
+        """Кэш продуктов: LRU в памяти + SQLite на диске"""
+        if cls._cache is None:
+            disk = None
+            if config.PRODUCT_CACHE_DB:
+                try:
+                    disk = SQLiteCache(config.PRODUCT_CACHE_DB, ttl=config.PRODUCT_CACHE_DISK_TTL)
+                except Exception as e:
+                    logger.error(f"Не удалось открыть кэш продуктов: {e}")
+            cls._cache = TwoTierCache(
+                LRUCache(maxsize=config.PRODUCT_CACHE_SIZE, ttl=config.PRODUCT_CACHE_TTL),
+                disk
+            )
+        return cls._cache
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        """Общая сессия с пулом соединений (создается при первом запросе)"""
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=config.NUTRITION_API_POOL_SIZE,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=config.NUTRITION_API_TIMEOUT)
+            )
+        return cls._session
+
+    @classmethod
+    async def close(cls):
+        """Закрыть общую сессию и кэш (вызывается при остановке бота)"""
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+        if cls._cache is not None:
+            logger.info(f"Статистика кэша продуктов: {cls._cache.get_stats()}, "
+                        f"объединено запросов: {cls._flight.stats['coalesced']}")
+            if cls._cache.disk is not None:
+                await asyncio.to_thread(cls._cache.disk.close)
+            cls._cache = None
+
     @staticmethod
     async def search_product(product_name: str) -> Optional[Dict]:
-        """Поиск информации о продукте через OpenFoodFacts"""
-        url = f"https://world.openfoodfacts.org/cgi/search.pl?action=process&search_terms={product_name}&json=true"
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            products = data.get('products', [])
-            if products:  
-                product = products[0]
-                nutriments = product.get('nutriments', {})
-                calories = nutriments.get('energy-kcal_100g', 0)
-                return {
-                    'name': product.get('product_name', product_name),
-                    'calories': round(float(calories), 2),
-                    'protein': nutriments.get('proteins_100g', 0),
-                    'carbs': nutriments.get('carbohydrates_100g', 0),
-                    'fat': nutriments.get('fat_100g', 0)
-                }
+        """Поиск информации о продукте: локальный индекс, кэш, затем OpenFoodFacts"""
+        index = await NutritionAPI.get_index()
+        if index is not None:
+            # Точное совпадение - поиск в словаре; нечеткий поиск занимает миллисекунды - в потоке
+            product = index.search_exact(product_name)
+            if product is None:
+                product = await asyncio.to_thread(
+                    index.search_similar, product_name, config.FOOD_INDEX_MIN_SCORE
+                )
+            if product is not None:
+                return product
+
+        key = NutritionAPI.normalize_query(product_name)
+        cache = NutritionAPI.get_cache()
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Одновременные запросы одного продукта делают один HTTP-запрос
+        return await NutritionAPI._flight.do(key, NutritionAPI._fetch_and_cache, key, product_name)
+
+    @staticmethod
+    async def _fetch_and_cache(key: str, product_name: str) -> Optional[Dict]:
+        product = await NutritionAPI._fetch_product(product_name)
+        if product is not None:
+            await NutritionAPI.get_cache().set(key, product)
+        return product
+
+    @staticmethod
+    async def _fetch_product(product_name: str) -> Optional[Dict]:
+        """Запрос продукта в OpenFoodFacts"""
+        params = {
+            'action': 'process',
+            'search_terms': product_name,
+            'json': 'true'
+        }
+        try:
+            session = NutritionAPI.get_session()
+            async with session.get(NutritionAPI.SEARCH_URL, params=params) as response:
+                if response.status != 200:
+                    logger.warning(f"Ошибка OpenFoodFacts: {response.status}")
+                    return None
+                data = await response.json(content_type=None)
+        except Exception as e:
+            logger.error(f"Ошибка при поиске продукта: {e}")
             return None
-        print(f"Ошибка: {response.status_code}")
-        return None                    
\ No newline at end of file
+
+        products = data.get('products', [])
+        if products:
+            product = products[0]
+            nutriments = product.get('nutriments', {})
+            calories = nutriments.get('energy-kcal_100g', 0)
+            return {
+                'name': product.get('product_name', product_name),
+                'calories': round(float(calories), 2),
+                'protein': nutriments.get('proteins_100g', 0),
+                'carbs': nutriments.get('carbohydrates_100g', 0),
+                'fat': nutriments.get('fat_100g', 0)
+            }
+        return None
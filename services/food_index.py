@@ -0,0 +1,256 @@
+import csv
+import json
+import os
+import sqlite3
+import sys
+import logging
+import argparse
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class FoodIndex:
+    """Локальный индекс продуктов с нечетким поиском по триграммам"""
+
+    NAME_FIELDS = ('product_name_ru', 'product_name', 'product_name_en', 'name')
+    NUTRIENT_FIELDS = {
+        'calories': ('energy-kcal_100g', 'calories'),
+        'protein': ('proteins_100g', 'protein'),
+        'carbs': ('carbohydrates_100g', 'carbs'),
+        'fat': ('fat_100g', 'fat')
+    }
+    BATCH_SIZE = 5000
+    # Сколько номеров из списков триграмм просматривается целиком при нечетком поиске
+    MAX_SCAN = 50000
+    # Сколько лучших кандидатов досчитывается по частым триграммам
+    TOP_CANDIDATES = 500
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.calories = array('f')
+        self.protein = array('f')
+        self.carbs = array('f')
+        self.fat = array('f')
+        self.trigram_counts = array('H')
+        self.exact: Dict[str, int] = {}
+        self.postings: Dict[str, array] = defaultdict(lambda: array('I'))
+
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """Нормализация названия: нижний регистр, ё -> е, единичные пробелы"""
+        return ' '.join(name.lower().replace('ё', 'е').split())
+
+    @staticmethod
+    def trigrams(norm: str) -> set:
+        """Множество триграмм нормализованного названия"""
+        padded = f" {norm} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, calories: float, protein: float, carbs: float, fat: float):
+        """Добавить продукт в индекс в памяти"""
+        norm = self.normalize_name(name)
+        if not norm or norm in self.exact:
+            return
+        product_id = len(self.names)
+        self.names.append(name)
+        self.calories.append(calories)
+        self.protein.append(protein)
+        self.carbs.append(carbs)
+        self.fat.append(fat)
+        self.exact[norm] = product_id
+        grams = self.trigrams(norm)
+        self.trigram_counts.append(min(len(grams), 65535))
+        for gram in grams:
+            self.postings[gram].append(product_id)
+
+    def _product(self, product_id: int) -> Dict:
+        return {
+            'name': self.names[product_id],
+            'calories': round(self.calories[product_id], 2),
+            'protein': round(self.protein[product_id], 2),
+            'carbs': round(self.carbs[product_id], 2),
+            'fat': round(self.fat[product_id], 2)
+        }
+
+    def search(self, query: str, min_score: float = 0.4) -> Optional[Dict]:
+        """Найти продукт: точное совпадение, иначе ближайший по триграммам"""
+        return self.search_exact(query) or self.search_similar(query, min_score)
+
+    def search_exact(self, query: str) -> Optional[Dict]:
+        """Точное совпадение нормализованного названия (словарь, можно звать из цикла событий)"""
+        product_id = self.exact.get(self.normalize_name(query))
+        return self._product(product_id) if product_id is not None else None
+
+    def search_similar(self, query: str, min_score: float = 0.4) -> Optional[Dict]:
+        """Ближайший продукт по триграммам (миллисекунды: из цикла событий - через поток)
+
+        Кандидаты набираются из самых редких триграмм запроса, пока просмотрено не больше
+        MAX_SCAN номеров. Частые триграммы проверяются бинарным поиском (списки
+        отсортированы) только для TOP_CANDIDATES лучших кандидатов.
+        """
+        norm = self.normalize_name(query)
+        if not norm:
+            return None
+
+        grams = self.trigrams(norm)
+        lists = sorted(
+            (self.postings[gram] for gram in grams if gram in self.postings),
+            key=len
+        )
+
+        shared: Dict[int, int] = defaultdict(int)
+        scanned = 0
+        rare = 0
+        for ids in lists:
+            if shared and scanned + len(ids) > self.MAX_SCAN:
+                break
+            for candidate in ids:
+                shared[candidate] += 1
+            scanned += len(ids)
+            rare += 1
+
+        frequent = lists[rare:]
+        if frequent:
+            # Больше общих редких триграмм, при равенстве - короче название
+            top = heapq.nlargest(
+                self.TOP_CANDIDATES, shared.items(),
+                key=lambda item: (item[1], -self.trigram_counts[item[0]])
+            )
+            shared = {}
+            for candidate, common in top:
+                for ids in frequent:
+                    position = bisect_left(ids, candidate)
+                    if position < len(ids) and ids[position] == candidate:
+                        common += 1
+                shared[candidate] = common
+
+        best_id, best_score = None, 0.0
+        for candidate, common in shared.items():
+            score = common / (len(grams) + self.trigram_counts[candidate] - common)
+            if score > best_score:
+                best_id, best_score = candidate, score
+
+        if best_id is None or best_score < min_score:
+            return None
+        return self._product(best_id)
+
+    @staticmethod
+    def _to_float(value) -> Optional[float]:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def _parse_record(cls, record: Dict) -> Optional[tuple]:
+        """Достать название и КБЖУ на 100г из записи дампа"""
+        nutriments = record.get('nutriments')
+        if isinstance(nutriments, dict):
+            record = {**record, **nutriments}
+
+        name = None
+        for field in cls.NAME_FIELDS:
+            if record.get(field):
+                name = str(record[field]).strip()
+                break
+        if not name:
+            return None
+
+        values = []
+        for field, keys in cls.NUTRIENT_FIELDS.items():
+            value = None
+            for key in keys:
+                value = cls._to_float(record.get(key))
+                if value is not None:
+                    break
+            if field == 'calories' and value is None:
+                return None
+            values.append(value or 0.0)
+        return (name, *values)
+
+    @staticmethod
+    def _read_records(source_path: str) -> Iterator[Dict]:
+        """Потоковое чтение дампа OpenFoodFacts (CSV/TSV) или JSONL"""
+        csv.field_size_limit(sys.maxsize)
+        with open(source_path, encoding='utf-8', errors='replace', newline='') as f:
+            if source_path.endswith(('.jsonl', '.json')):
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+            else:
+                delimiter = ',' if source_path.endswith('.csv') and '\t' not in f.readline() else '\t'
+                f.seek(0)
+                yield from csv.DictReader(f, delimiter=delimiter)
+
+    @classmethod
+    def build(cls, source_path: str, index_path: str) -> int:
+        """Построить индекс на диске из дампа, не загружая дамп в память целиком"""
+        directory = os.path.dirname(index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(index_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            "norm TEXT PRIMARY KEY, name TEXT NOT NULL, calories REAL, "
+            "protein REAL, carbs REAL, fat REAL)"
+        )
+
+        count = 0
+        batch = []
+        for record in cls._read_records(source_path):
+            parsed = cls._parse_record(record)
+            if parsed is None:
+                continue
+            name = parsed[0]
+            batch.append((cls.normalize_name(name), *parsed))
+            if len(batch) >= cls.BATCH_SIZE:
+                # INSERT OR IGNORE пропускает повторы: считаем только вставленные строки
+                count += conn.executemany("INSERT OR IGNORE INTO products VALUES (?, ?, ?, ?, ?, ?)", batch).rowcount
+                conn.commit()
+                batch = []
+        if batch:
+            count += conn.executemany("INSERT OR IGNORE INTO products VALUES (?, ?, ?, ?, ?, ?)", batch).rowcount
+            conn.commit()
+
+        conn.close()
+        logger.info(f"Проиндексировано записей: {count}")
+        return count
+
+    @classmethod
+    def load(cls, index_path: str) -> 'FoodIndex':
+        """Загрузить индекс с диска в память"""
+        index = cls()
+        conn = sqlite3.connect(index_path)
+        try:
+            rows = conn.execute("SELECT name, calories, protein, carbs, fat FROM products")
+            for name, calories, protein, carbs, fat in rows:
+                index.add(name, calories or 0.0, protein or 0.0, carbs or 0.0, fat or 0.0)
+        finally:
+            conn.close()
+        index.postings.default_factory = None
+        logger.info(f"Загружен индекс продуктов: {len(index)} записей")
+        return index
+
+if __name__ == "__main__":
+    from config import config
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Импорт дампа продуктов в локальный индекс")
+    parser.add_argument('source', help="Дамп OpenFoodFacts (CSV/TSV) или JSONL со списком продуктов")
+    parser.add_argument('--index', default=config.FOOD_INDEX_DB, help="Путь к файлу индекса")
+    args = parser.parse_args()
+
+    FoodIndex.build(args.source, args.index)
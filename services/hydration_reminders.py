@@ -0,0 +1,197 @@
+import time
+import heapq
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+from config import config
+from services.day_rollover import DayRollover
+from services.outbox import REMINDER, outbox
+from utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 3600
+
+class HydrationReminders:
+    """Напоминания выпить воды тем, кто отстает от нормы на это время дня (по /reminders)
+
+    Норма распределяется равномерно с REMINDER_START_HOUR до REMINDER_END_HOUR по местному
+    времени. Для каждого пользователя заранее считается момент, когда ожидаемое к этому
+    времени количество обгонит выпитое на REMINDER_LAG_ML, и он кладется в кучу таймеров.
+    Цикл спит до ближайшего момента, а не обходит всех пользователей. Любое изменение
+    данных пользователя (выпитая вода, норма после тренировки или погоды, профиль)
+    пересчитывает момент только этого пользователя; старые записи в куче пропускаются
+    при извлечении. Между напоминаниями - не меньше REMINDER_MIN_INTERVAL.
+    """
+
+    _heap: List[Tuple[float, int]] = []
+    # user_id -> актуальный момент напоминания (время UNIX)
+    _due: Dict[int, float] = {}
+    _bot: Optional[Bot] = None
+    _task: Optional[asyncio.Task] = None
+    _wakeup: Optional[asyncio.Event] = None
+    _sending: Optional[asyncio.Semaphore] = None
+    _sends: Set[asyncio.Task] = set()
+    _listening = False
+    stats = {'sent': 0, 'skipped': 0, 'failed': 0}
+
+    @staticmethod
+    def window(local_now: float) -> Tuple[float, float]:
+        """Начало и конец окна напоминаний в местный день local_now (местное время в секундах)"""
+        day_start = local_now - local_now % DAY
+        return day_start + config.REMINDER_START_HOUR * 3600, day_start + config.REMINDER_END_HOUR * 3600
+
+    @classmethod
+    def expected_ml(cls, goal: float, local_now: float) -> float:
+        """Сколько воды стоит выпить к этому времени"""
+        start, end = cls.window(local_now)
+        return goal * min(1.0, max(0.0, (local_now - start) / (end - start)))
+
+    @classmethod
+    def next_due(cls, user_data: Dict, now: Optional[float] = None) -> float:
+        """Момент следующего напоминания: когда отставание от графика дойдет до REMINDER_LAG_ML"""
+        now = time.time() if now is None else now
+        offset = DayRollover.get_offset(user_data)
+        local_now = now + offset
+        goal = user_data.get('water_goal', 2000)
+        target = user_data.get('logged_water', 0) + config.REMINDER_LAG_ML
+        start, end = cls.window(local_now)
+
+        due = None
+        if 0 < goal and target < goal:
+            due = max(local_now, start + target / goal * (end - start))
+            last = user_data.get('water_reminded_at')
+            if last is not None:
+                due = max(due, last + config.REMINDER_MIN_INTERVAL + offset)
+        if due is None or due > end:
+            # Сегодня напоминать не о чем; после смены дня выпито 0
+            start += DAY
+            end += DAY
+            due = start + min(1.0, config.REMINDER_LAG_ML / goal if goal > 0 else 1.0) * (end - start)
+        return due - offset
+
+    @classmethod
+    def reschedule(cls, user_id: int, now: Optional[float] = None):
+        """Пересчитать момент напоминания пользователя (при каждом изменении его данных)"""
+        user_data = storage.get_user(user_id)
+        if not user_data or not user_data.get('water_reminders'):
+            cls._due.pop(user_id, None)
+            return
+        due = cls.next_due(user_data, now)
+        cls._due[user_id] = due
+        heapq.heappush(cls._heap, (due, user_id))
+        if cls._wakeup is not None and cls._heap[0] == (due, user_id):
+            cls._wakeup.set()
+        # Старые записи копятся с каждым пересчетом: время от времени куча собирается заново
+        if len(cls._heap) > 2 * len(cls._due) + 1000:
+            cls._heap = [(due, user_id) for user_id, due in cls._due.items()]
+            heapq.heapify(cls._heap)
+
+    @classmethod
+    def set_enabled(cls, user_id: int, enabled: bool):
+        """Включить или выключить напоминания пользователя"""
+        storage.update_user(user_id, {'water_reminders': enabled})
+
+    @classmethod
+    async def _fire(cls, user_id: int, now: float):
+        user_data = storage.get_user(user_id)
+        if not user_data or not user_data.get('water_reminders'):
+            return
+        water = storage.get_daily_progress(user_id)['water']
+        local_now = now + DayRollover.get_offset(user_data)
+        start, end = cls.window(local_now)
+        expected = cls.expected_ml(water['goal'], local_now)
+        # Запас в 1 мл: таймер может сработать чуть раньше расчетного момента
+        if start <= local_now <= end and water['logged'] < water['goal'] \
+                and expected - water['logged'] >= config.REMINDER_LAG_ML - 1:
+            storage.update_user(user_id, {'water_reminded_at': now})
+            # Не больше REMINDER_MAX_SENDING отправок сразу: остальные ждут, пока очередь исходящих их примет
+            await cls._sending.acquire()
+            task = asyncio.create_task(cls._send(user_id, water, expected))
+            cls._sends.add(task)
+            task.add_done_callback(cls._sends.discard)
+        else:
+            cls.stats['skipped'] += 1
+        cls.reschedule(user_id, now)
+
+    @classmethod
+    async def _send(cls, user_id: int, water: Dict, expected: float):
+        text = (
+            f"💧 Пора выпить воды: выпито {water['logged']:.0f} из {water['goal']:.0f} мл, "
+            f"к этому времени стоило бы около {expected:.0f} мл.\n"
+            f"Записать: /log_water 250. Отключить напоминания: /reminders выкл"
+        )
+        try:
+            with outbox.lane(REMINDER):
+                await cls._bot.send_message(user_id, text)
+            cls.stats['sent'] += 1
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота
+            cls.set_enabled(user_id, False)
+            cls.stats['failed'] += 1
+        except Exception as e:
+            cls.stats['failed'] += 1
+            logger.error(f"Ошибка отправки напоминания пользователю {user_id}: {e}")
+        finally:
+            cls._sending.release()
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            # Время берется заново на каждом шаге: _fire может ждать свободного места для отправки
+            while cls._heap and cls._heap[0][0] <= time.time():
+                due, user_id = heapq.heappop(cls._heap)
+                if cls._due.get(user_id) != due:
+                    continue
+                del cls._due[user_id]
+                try:
+                    await cls._fire(user_id, time.time())
+                except Exception as e:
+                    logger.error(f"Ошибка напоминания пользователю {user_id}: {e}")
+            now = time.time()
+            # Не спим дольше часа: часы системы могли сдвинуться
+            timeout = min(cls._heap[0][0] - now, 3600) if cls._heap else None
+            cls._wakeup.clear()
+            try:
+                await asyncio.wait_for(cls._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    async def start(cls, bot: Optional[Bot] = None):
+        """Разложить моменты напоминаний подписанных пользователей в кучу и запустить таймер"""
+        cls._heap = []
+        cls._due = {}
+        now = time.time()
+        for user_id, user_data in list(storage.users.items()):
+            if user_data.get('water_reminders'):
+                cls._due[user_id] = cls.next_due(user_data, now)
+        cls._heap = [(due, user_id) for user_id, due in cls._due.items()]
+        heapq.heapify(cls._heap)
+        logger.info(f"Напоминаний о воде запланировано: {len(cls._due)}")
+        if not cls._listening:
+            # Норма воды меняется не только в обработчиках воды: после тренировки, обновления
+            # погоды, правки профиля, смены дня - пересчет по любому изменению данных
+            storage.add_change_listener(cls.reschedule)
+            cls._listening = True
+
+        if bot is None:
+            logger.warning("Бот не передан: напоминания о воде не отправляются")
+            return
+        cls._bot = bot
+        cls._wakeup = asyncio.Event()
+        cls._sending = asyncio.Semaphore(config.REMINDER_MAX_SENDING)
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        """Остановить таймер; начатые отправки дорабатывает очередь исходящих"""
+        if cls._task is not None:
+            cls._task.cancel()
+            await asyncio.gather(cls._task, return_exceptions=True)
+            cls._task = None
+        cls._wakeup = None
+        logger.info(f"Напоминания о воде: {cls.stats}")
@@ -0,0 +1,283 @@
+import time
+import heapq
+import bisect
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMediaGroup, TelegramMethod
+from config import config
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Очереди исходящих сообщений по приоритету: из готовых к отправке первой идет меньшая
+INTERACTIVE, REPORT, REMINDER = 0, 1, 2
+LANE_NAMES = ('interactive', 'report', 'reminder')
+
+# Методы, которые отправляют или меняют сообщения в чате и считаются в лимитах Telegram
+SCHEDULED_PREFIXES = ('send', 'copy', 'forward', 'edit')
+
+_lane: ContextVar[int] = ContextVar('outbox_lane', default=INTERACTIVE)
+
+class _Job:
+    """Запрос в очереди чата и future вызывающего"""
+
+    def __init__(self, lane: int, seq: int, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod,
+                 future: asyncio.Future):
+        self.lane = lane
+        self.seq = seq
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.future = future
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.lane, self.seq
+
+class _Chat:
+    """Лимит и очередь одного чата; пока busy, следующий запрос чата не отправляется"""
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.jobs: List[_Job] = []
+        self.busy = False
+
+class Outbox(BaseRequestMiddleware):
+    """Очередь исходящих сообщений с учетом лимитов Telegram (middleware HTTP-сессии бота)
+
+    Запросы send*/copy*/forward*/edit* с числовым chat_id встают в очередь своего
+    чата и уходят не чаще OUTBOX_GLOBAL_RATE в секунду всего и OUTBOX_CHAT_RATE
+    (в группах OUTBOX_GROUP_RATE) в каждый чат. Из чатов, которым уже можно
+    отправлять, первым идет чат с самым приоритетным сообщением: ответы (INTERACTIVE),
+    затем графики (REPORT), затем напоминания (REMINDER). Очередь задается через
+    with outbox.lane(...), по умолчанию - ответ. Сообщения одного чата уходят
+    по одному и по порядку. Ответ 429 приостанавливает на retry_after и чат,
+    и общий лимит бота, запрос повторяется до OUTBOX_MAX_RETRIES раз.
+    Остальные методы проходят без очереди.
+    """
+
+    def __init__(self):
+        self._chats: Dict[int, _Chat] = {}
+        # (очередь, номер, чат) - чаты, которым можно отправлять; устаревшие записи пропускаются
+        self._ready: List[Tuple[int, int, int]] = []
+        # (время, чат) - чаты, ждущие токенов своего лимита
+        self._sleeping: List[Tuple[float, int]] = []
+        self._global: Optional[TokenBucket] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self._seq = 0
+        self._dispatched = 0
+        self._waits: List[Deque[float]] = [deque(maxlen=1000) for _ in LANE_NAMES]
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0}
+
+    @staticmethod
+    @contextmanager
+    def lane(value: int):
+        """Отправлять сообщения внутри блока в очереди value (REPORT, REMINDER)"""
+        token = _lane.set(value)
+        try:
+            yield
+        finally:
+            _lane.reset(token)
+
+    @staticmethod
+    def _chat_id(method: TelegramMethod) -> Optional[int]:
+        name = method.__api_method__
+        if name == 'sendChatAction' or not name.startswith(SCHEDULED_PREFIXES):
+            return None
+        chat_id = getattr(method, 'chat_id', None)
+        return chat_id if isinstance(chat_id, int) else None
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        chat_id = self._chat_id(method)
+        if chat_id is None:
+            return await make_request(bot, method)
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, make_request, bot, method, future)
+        return await future
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._global = TokenBucket(config.OUTBOX_GLOBAL_RATE, config.OUTBOX_GLOBAL_BURST)
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _enqueue(self, chat_id: int, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod, future: asyncio.Future):
+        lane = _lane.get()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            rate = config.OUTBOX_CHAT_RATE if chat_id > 0 else config.OUTBOX_GROUP_RATE
+            chat = self._chats[chat_id] = _Chat(TokenBucket(rate, config.OUTBOX_CHAT_BURST))
+
+        # Внутри чата более приоритетные сообщения обгоняют еще не отправленные менее приоритетные
+        self._seq += 1
+        position = bisect.bisect_right(chat.jobs, (lane, self._seq), key=lambda job: job.key)
+        job = _Job(lane, self._seq, make_request, bot, method, future)
+        chat.jobs.insert(position, job)
+        if position == 0:
+            self._schedule(chat_id)
+            self._wakeup.set()
+
+    def _schedule(self, chat_id: int, now: Optional[float] = None):
+        """Поставить чат в очередь готовых или ждущих по его лимиту"""
+        chat = self._chats.get(chat_id)
+        if chat is None or chat.busy or not chat.jobs:
+            return
+        now = time.monotonic() if now is None else now
+        head = chat.jobs[0]
+        delay = chat.bucket.delay(head.cost, now)
+        if delay > 0:
+            heapq.heappush(self._sleeping, (now + delay, chat_id))
+        else:
+            heapq.heappush(self._ready, (head.lane, head.seq, chat_id))
+
+    def _pop_ready(self, now: float) -> Optional[int]:
+        while self._ready:
+            lane, seq, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.busy or not chat.jobs or chat.jobs[0].key != (lane, seq):
+                continue
+            if chat.bucket.delay(chat.jobs[0].cost, now) > 0:
+                self._schedule(chat_id, now)
+                continue
+            return chat_id
+        return None
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._sleeping and self._sleeping[0][0] <= now:
+                _, chat_id = heapq.heappop(self._sleeping)
+                self._schedule(chat_id, now)
+
+            if self._ready:
+                delay = self._global.delay(1, now)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                chat_id = self._pop_ready(now)
+                if chat_id is not None:
+                    self._dispatch(chat_id, now)
+                    continue
+
+            timeout = self._sleeping[0][0] - now if self._sleeping else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self, chat_id: int, now: float):
+        chat = self._chats[chat_id]
+        job = chat.jobs.pop(0)
+        if job.future.done():
+            # Вызывающий отменил отправку
+            self._schedule(chat_id, now)
+            return
+        chat.busy = True
+        chat.bucket.take(job.cost, now)
+        self._global.take(job.cost, now)
+        if not job.attempts:
+            self._waits[job.lane].append(now - job.enqueued_at)
+        task = asyncio.create_task(self._deliver(chat_id, chat, job))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+        self._dispatched += 1
+        if self._dispatched % 1000 == 0:
+            self._sweep(now)
+
+    async def _deliver(self, chat_id: int, chat: _Chat, job: _Job):
+        try:
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            job.attempts += 1
+            self.stats['retried'] += 1
+            chat.bucket.pause(e.retry_after)
+            # Flood wait Telegram ограничивает весь бот, а не только этот чат
+            self._global.pause(e.retry_after)
+            if job.attempts <= config.OUTBOX_MAX_RETRIES:
+                logger.warning(f"Чат {chat_id}: Telegram просит подождать {e.retry_after} с, повтор {job.attempts}")
+                bisect.insort(chat.jobs, job, key=lambda item: item.key)
+            else:
+                self._finish(chat_id, job, error=e)
+        except Exception as e:
+            self._finish(chat_id, job, error=e)
+        else:
+            self._finish(chat_id, job, result=result)
+        finally:
+            chat.busy = False
+            self._schedule(chat_id)
+            self._wakeup.set()
+
+    def _finish(self, chat_id: int, job: _Job, result: Any = None, error: Optional[Exception] = None):
+        if error is None:
+            self.stats['sent'] += 1
+        else:
+            self.stats['failed'] += 1
+            logger.error(f"Чат {chat_id}: не удалось выполнить {job.method.__api_method__}: {error}")
+        if job.future.done():
+            return
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    def _sweep(self, now: float):
+        """Забыть чаты без очереди, чей лимит полностью восстановился"""
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.jobs and not chat.busy and chat.bucket.is_full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def queued(self) -> int:
+        return sum(len(chat.jobs) for chat in self._chats.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Размер очереди, счетчики и время ожидания отправки (мс, 95-й перцентиль) по очередям"""
+        stats = {'queued': self.queued(), 'sending': len(self._deliveries), 'chats': len(self._chats), **self.stats}
+        for name, waits in zip(LANE_NAMES, self._waits):
+            ordered = sorted(waits)
+            stats[f'{name}_wait_ms_p95'] = (
+                round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1) if ordered else 0.0
+            )
+        return stats
+
+    async def stop(self):
+        """Дождаться отправки очереди (не дольше WEBHOOK_DRAIN_TIMEOUT) и остановить планировщик"""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + config.WEBHOOK_DRAIN_TIMEOUT
+        while (self.queued() or self._deliveries) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.queued():
+            logger.warning(f"Не отправлено сообщений: {self.queued()}")
+
+        tasks = [self._task, *self._deliveries]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for chat in self._chats.values():
+            for job in chat.jobs:
+                job.future.cancel()
+        logger.info(f"Очередь исходящих сообщений остановлена: {self.get_stats()}")
+        self._chats.clear()
+        self._ready.clear()
+        self._sleeping.clear()
+        self._task = None
+
+outbox = Outbox()
@@ -0,0 +1,334 @@
+import os
+import hmac
+import json
+import signal
+import asyncio
+import threading
+import logging
+import multiprocessing
+from queue import Full
+from typing import Callable, Dict, List, Optional
+import aiohttp
+from aiohttp import web
+from config import config
+from services.webhook_server import SECRET_HEADER
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API = "https://api.telegram.org"
+
+def shard_of(user_id: int, shards: int) -> int:
+    """Номер воркера пользователя (стабилен между перезапусками)"""
+    return user_id % shards
+
+def shard_path(path: str, shard: int) -> str:
+    """users.sqlite -> users.shard0.sqlite"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.shard{shard}{ext}"
+
+def update_user_id(raw: Dict) -> Optional[int]:
+    """ID пользователя (или чата) из сырого обновления Telegram без разбора в модели aiogram"""
+    for event in raw.values():
+        if not isinstance(event, dict):
+            continue
+        user = event.get('from') or event.get('user')
+        if isinstance(user, dict) and 'id' in user:
+            return user['id']
+        chat = event.get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+def configure_shard(shard: int, shards: int):
+    """Свои файлы данных, доля пула графиков и лимита отправки для процесса-воркера"""
+    config.STORAGE_DB = shard_path(config.STORAGE_DB, shard)
+    config.FSM_DB = shard_path(config.FSM_DB, shard)
+    config.JOURNAL_DIR = os.path.join(config.JOURNAL_DIR, f"shard{shard}")
+    config.CHART_WORKERS = max(1, config.CHART_WORKERS // shards)
+    # Лимит Telegram общий на бота: каждому воркеру - его доля
+    config.OUTBOX_GLOBAL_RATE = config.OUTBOX_GLOBAL_RATE / shards
+    config.OUTBOX_GLOBAL_BURST = max(1, config.OUTBOX_GLOBAL_BURST // shards)
+
+def shard_count_path() -> str:
+    """Файл с числом шардов рядом с базами шардов (users.shards)"""
+    return os.path.splitext(config.STORAGE_DB)[0] + '.shards'
+
+def read_shard_count() -> Optional[int]:
+    """Число шардов, по которым сейчас разложены пользователи; None - еще не раскладывались"""
+    path = shard_count_path()
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return int(f.read().strip())
+    # Базы шардов, разложенные до появления файла с их числом
+    count = 0
+    while os.path.exists(shard_path(config.STORAGE_DB, count)):
+        count += 1
+    return count or None
+
+def _remove_db(path: str):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def split_storage(shards: int):
+    """Разложить базу пользователей по шардам: при первом запуске с WORKERS > 1
+    и заново при смене числа воркеров (исходная общая база сохраняется).
+    shards=1 (запуск в одном процессе) собирает шарды обратно в общую базу."""
+    from utils.backends import SQLiteBackend
+
+    current = read_shard_count()
+    if current == shards or (current is None and shards == 1):
+        return
+    if config.STORAGE_BACKEND == 'journal':
+        if shards > 1:
+            raise RuntimeError("Журнал событий не делится по воркерам: для WORKERS > 1 нужен STORAGE_BACKEND=sqlite")
+        raise RuntimeError(
+            f"Пользователи разложены по {current} шардам SQLite: соберите их, запустив с STORAGE_BACKEND=sqlite"
+        )
+    if config.STORAGE_BACKEND != 'sqlite':
+        return
+    if current is None:
+        sources = [config.STORAGE_DB] if os.path.exists(config.STORAGE_DB) else []
+    else:
+        sources = [shard_path(config.STORAGE_DB, shard) for shard in range(current)]
+
+    users: Dict[int, Dict] = {}
+    for path in sources:
+        source = SQLiteBackend(path)
+        try:
+            users.update(source.load_all())
+        finally:
+            source.close()
+    buckets: List[list] = [[] for _ in range(shards)]
+    for user_id, user_data in users.items():
+        buckets[shard_of(user_id, shards)].append((user_id, json.dumps(user_data, ensure_ascii=False)))
+
+    # Новые базы пишутся рядом и заменяют старые только целиком записанными
+    paths = [shard_path(config.STORAGE_DB, shard) for shard in range(shards)] if shards > 1 else [config.STORAGE_DB]
+    for path, rows in zip(paths, buckets):
+        _remove_db(path + '.tmp')
+        backend = SQLiteBackend(path + '.tmp')
+        try:
+            backend.save_many(rows)
+        finally:
+            backend.close()
+    for path in paths:
+        _remove_db(path)
+        os.replace(path + '.tmp', path)
+    # Базы шардов, которых больше нет (при сборке в общую базу - все)
+    for shard in range(shards if shards > 1 else 0, current or 0):
+        _remove_db(shard_path(config.STORAGE_DB, shard))
+    if current is not None:
+        # Состояния диалогов лежат по старому разбиению: незаконченные диалоги начнутся заново
+        for shard in range(current):
+            _remove_db(shard_path(config.FSM_DB, shard))
+        logger.warning(f"Число воркеров изменилось ({current} -> {shards}): незаконченные диалоги сброшены")
+
+    if shards > 1:
+        with open(shard_count_path(), 'w', encoding='utf-8') as f:
+            f.write(str(shards))
+        logger.info(f"Пользователи ({len(users)}) разложены по {shards} шардам")
+    else:
+        if os.path.exists(shard_count_path()):
+            os.remove(shard_count_path())
+        logger.info(f"Пользователи ({len(users)}) собраны из шардов в {config.STORAGE_DB}")
+
+def run_worker(shard: int, shards: int, token: str, updates, ready, session_factory: Optional[Callable] = None):
+    """Точка входа процесса-воркера"""
+    # Остановкой управляет главный процесс (пришлет None в очередь)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_shard(shard, shards)
+    asyncio.run(_worker_main(shard, token, updates, ready, session_factory))
+
+def _pump(updates, loop: asyncio.AbstractEventLoop, inbox: asyncio.Queue):
+    """Поток воркера: перекладывать обновления из межпроцессной очереди в asyncio"""
+    while True:
+        raw = updates.get()
+        asyncio.run_coroutine_threadsafe(inbox.put(raw), loop).result()
+        if raw is None:
+            return
+
+async def _worker_main(shard: int, token: str, updates, ready, session_factory: Optional[Callable]):
+    from aiogram.types import Update
+    from bot import create_bot, create_dispatcher
+
+    dp = create_dispatcher()
+    bot = create_bot(token, session=session_factory() if session_factory else None)
+    await dp.emit_startup(bot=bot)
+    ready.set()
+
+    # Обновления подаются по одному: параллельность задает очередь обработки диспетчера,
+    # а при ее переполнении прием ждет, заполняется межпроцессная очередь,
+    # и главный процесс притормаживает прием обновлений
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=1)
+    threading.Thread(target=_pump, args=(updates, asyncio.get_running_loop(), inbox), daemon=True).start()
+    handled = 0
+
+    while True:
+        raw = await inbox.get()
+        if raw is None:
+            break
+        try:
+            await dp.feed_update(bot, Update.model_validate(raw, context={'bot': bot}))
+            handled += 1
+        except Exception as e:
+            logger.error(f"Шард {shard}: ошибка обработки обновления {raw.get('update_id')}: {e}")
+
+    await dp.emit_shutdown(bot=bot)
+    await bot.session.close()
+    logger.info(f"Шард {shard} остановлен, принято обновлений: {handled}")
+
+class ShardRouter:
+    """Главный процесс: принимает обновления (polling или вебхук) и раздает их воркерам по user_id
+
+    Каждый воркер - отдельный процесс со своей частью UserStorage и своими состояниями
+    диалогов, поэтому блокировок между процессами нет. Обновления одного пользователя
+    всегда попадают к одному воркеру.
+    """
+
+    def __init__(self, token: str, workers: int, session_factory: Optional[Callable] = None):
+        self.token = token
+        self.workers = workers
+        self.session_factory = session_factory
+        self._context = multiprocessing.get_context('spawn')
+        self._queues = []
+        self._processes = []
+        self._stop_event: Optional[asyncio.Event] = None
+        self.stats = {'routed': [0] * workers, 'throttled': 0}
+
+    async def start(self):
+        """Запустить воркеров и дождаться загрузки их данных"""
+        split_storage(self.workers)
+        events = []
+        for shard in range(self.workers):
+            updates = self._context.Queue(maxsize=config.WORKER_QUEUE_SIZE)
+            ready = self._context.Event()
+            process = self._context.Process(
+                target=run_worker,
+                args=(shard, self.workers, self.token, updates, ready, self.session_factory),
+                name=f"shard-{shard}"
+            )
+            process.start()
+            self._queues.append(updates)
+            self._processes.append(process)
+            events.append(ready)
+        while not all(event.is_set() for event in events):
+            for process in self._processes:
+                if not process.is_alive():
+                    raise RuntimeError(f"Воркер {process.name} завершился при запуске (код {process.exitcode})")
+            await asyncio.sleep(0.05)
+        logger.info(f"Запущено воркеров: {self.workers}")
+
+    async def route(self, raw: Dict):
+        """Передать обновление воркеру пользователя; если его очередь полна - подождать"""
+        user_id = update_user_id(raw)
+        key = user_id if user_id is not None else raw.get('update_id', 0)
+        shard = shard_of(key, self.workers)
+        updates = self._queues[shard]
+        while True:
+            try:
+                updates.put_nowait(raw)
+                break
+            except Full:
+                self.stats['throttled'] += 1
+                await asyncio.sleep(0.005)
+        self.stats['routed'][shard] += 1
+
+    async def stop(self):
+        """Дождаться, пока воркеры обработают очереди, и остановить их"""
+        for updates in self._queues:
+            await asyncio.to_thread(updates.put, None)
+        for process in self._processes:
+            await asyncio.to_thread(process.join, config.WEBHOOK_DRAIN_TIMEOUT)
+            if process.is_alive():
+                logger.warning(f"Воркер {process.name} не остановился, завершаем принудительно")
+                process.terminate()
+        logger.info(f"Воркеры остановлены: {self.stats}")
+
+    async def _api(self, session: aiohttp.ClientSession, method: str, **params) -> Dict:
+        async with session.post(f"{TELEGRAM_API}/bot{self.token}/{method}", json=params) as response:
+            return await response.json()
+
+    async def poll(self):
+        """Long polling без разбора обновлений: главный процесс только маршрутизирует"""
+        offset = None
+        timeout = aiohttp.ClientTimeout(total=config.POLLING_TIMEOUT + 15)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                params = {'timeout': config.POLLING_TIMEOUT}
+                if offset is not None:
+                    params['offset'] = offset
+                try:
+                    payload = await self._api(session, 'getUpdates', **params)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    logger.warning(f"Ошибка получения обновлений: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                if not payload.get('ok'):
+                    retry_after = payload.get('parameters', {}).get('retry_after', 1)
+                    logger.warning(f"Telegram отклонил getUpdates: {payload.get('description')}")
+                    await asyncio.sleep(retry_after)
+                    continue
+                for raw in payload['result']:
+                    await self.route(raw)
+                    offset = raw['update_id'] + 1
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), config.WEBHOOK_SECRET.encode()):
+            return web.Response(status=401)
+        if self._stop_event is not None and self._stop_event.is_set():
+            return web.Response(status=503)
+        try:
+            raw = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        await self.route(raw)
+        return web.Response()
+
+    async def _serve_webhook(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post(config.WEBHOOK_PATH, self.handle_webhook)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT).start()
+        logger.info(f"Вебхук слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+        if config.WEBHOOK_URL:
+            async with aiohttp.ClientSession() as session:
+                result = await self._api(
+                    session, 'setWebhook',
+                    url=config.WEBHOOK_URL.rstrip('/') + config.WEBHOOK_PATH,
+                    secret_token=config.WEBHOOK_SECRET,
+                    max_connections=config.WEBHOOK_MAX_CONNECTIONS
+                )
+            logger.info(f"Регистрация вебхука: {result.get('description', result.get('ok'))}")
+        return runner
+
+    async def run(self):
+        """Работать до SIGINT/SIGTERM: прием обновлений в выбранном режиме, затем остановка воркеров"""
+        if config.BOT_MODE == 'webhook' and not config.WEBHOOK_SECRET:
+            raise RuntimeError("Для вебхука с воркерами нужен WEBHOOK_SECRET")
+        self._stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop_event.set)
+            except NotImplementedError:
+                pass
+
+        await self.start()
+        runner = None
+        poller = None
+        try:
+            if config.BOT_MODE == 'webhook':
+                runner = await self._serve_webhook()
+            else:
+                poller = asyncio.create_task(self.poll())
+            await self._stop_event.wait()
+        finally:
+            if poller is not None:
+                poller.cancel()
+                await asyncio.gather(poller, return_exceptions=True)
+            if runner is not None:
+                await runner.cleanup()
+            await self.stop()
@@ -0,0 +1,159 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class PipelineOverloaded(Exception):
+    """Очередь обработки переполнена, обновление не принято"""
+
+class UpdatePipeline(BaseMiddleware):
+    """Ограниченная очередь обработки обновлений (outer-middleware диспетчера)
+
+    Обновление ставится в очередь своего чата и сразу возвращает управление приему.
+    Обновления одного чата обрабатываются строго по порядку, разные чаты - параллельно,
+    не больше concurrency одновременно. Всего в очереди не больше max_pending обновлений:
+    при переполнении прием либо ждет (overflow='wait', для polling и воркеров), либо
+    получает PipelineOverloaded (overflow='shed', вебхук отвечает 503 и Telegram
+    повторит позже). Чат, прислав больше chat_queue_size необработанных обновлений,
+    теряет лишние.
+    """
+
+    def __init__(self, concurrency: int, max_pending: int, chat_queue_size: int, overflow: str = 'wait'):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.chat_queue_size = chat_queue_size
+        self.overflow = overflow
+        self._slots = asyncio.Semaphore(max_pending)
+        # чат -> очередь (время постановки, обработчик, событие, данные); чат есть в словаре,
+        # пока у него есть необработанные обновления или одно обрабатывается
+        self._chats: Dict[int, Deque[Tuple[float, Callable, TelegramObject, Dict]]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._reporter: Optional[asyncio.Task] = None
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self.pending = 0
+        self.in_flight = 0
+        self.stats = {'accepted': 0, 'processed': 0, 'failed': 0, 'throttled': 0, 'shed': 0}
+
+    @staticmethod
+    def chat_key(event: TelegramObject, data: Dict[str, Any]) -> int:
+        chat = data.get('event_chat')
+        if chat is not None:
+            return chat.id
+        user = data.get('event_from_user')
+        if user is not None:
+            return user.id
+        return getattr(event, 'update_id', 0)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        key = self.chat_key(event, data)
+        queue = self._chats.get(key)
+        if queue is not None and len(queue) >= self.chat_queue_size:
+            self.stats['shed'] += 1
+            logger.warning(f"Чат {key}: больше {self.chat_queue_size} необработанных обновлений, лишнее отброшено")
+            return None
+
+        if self._slots.locked():
+            if self.overflow == 'shed':
+                self.stats['shed'] += 1
+                raise PipelineOverloaded()
+            self.stats['throttled'] += 1
+        await self._slots.acquire()
+
+        # Пока ждали места, очередь чата могла освободиться и исчезнуть
+        queue = self._chats.get(key)
+        if queue is None:
+            queue = self._chats[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append((time.monotonic(), handler, event, data))
+        self.pending += 1
+        self.stats['accepted'] += 1
+        return None
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._chats[key]
+            enqueued_at, handler, event, data = queue.popleft()
+            self._waits.append(time.monotonic() - enqueued_at)
+            self.in_flight += 1
+            try:
+                # FSM-middleware aiogram прочитал состояние еще при постановке в очередь,
+                # а предыдущее обновление этого чата могло его сменить
+                state = data.get('state')
+                if state is not None:
+                    data['raw_state'] = await state.get_state()
+                await handler(event, data)
+                self.stats['processed'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.error(f"Ошибка обработки обновления чата {key}: {e}", exc_info=True)
+            finally:
+                self.in_flight -= 1
+                self.pending -= 1
+                self._slots.release()
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очереди, число чатов и время ожидания (мс) по последним 1000 обновлениям"""
+        waits = sorted(self._waits)
+        def percentile(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1) if waits else 0.0
+        return {
+            'pending': self.pending,
+            'in_flight': self.in_flight,
+            'chats': len(self._chats),
+            'wait_ms_p50': percentile(0.5),
+            'wait_ms_p95': percentile(0.95),
+            'wait_ms_max': percentile(1.0),
+            **self.stats
+        }
+
+    async def _report_loop(self):
+        last_accepted = 0
+        while True:
+            await asyncio.sleep(config.PIPELINE_STATS_INTERVAL)
+            if self.stats['accepted'] != last_accepted or self.pending:
+                last_accepted = self.stats['accepted']
+                logger.info(f"Очередь обновлений: {self.get_stats()}")
+
+    async def start(self):
+        """Запустить обработчики очереди (вызывается при старте бота)"""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            self._reporter = asyncio.create_task(self._report_loop())
+
+    async def drain(self, timeout: float) -> bool:
+        """Дождаться обработки всего, что уже в очереди; False, если не успели"""
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return not self.pending
+
+    async def stop(self):
+        """Доработать очередь (не дольше WEBHOOK_DRAIN_TIMEOUT) и остановить обработчики"""
+        if not await self.drain(config.WEBHOOK_DRAIN_TIMEOUT):
+            logger.warning(f"Не дождались обработки {self.pending} обновлений")
+        tasks = [*self._workers, *([self._reporter] if self._reporter else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._reporter = None
+        logger.info(f"Очередь обновлений остановлена: {self.get_stats()}")
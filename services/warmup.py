@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Optional
+from services.chart_renderer import ChartRenderer
+from services.food_api import NutritionAPI
+from utils.startup import profiler
+
+logger = logging.getLogger(__name__)
+
+class Warmup:
+    """Фоновый прогрев тяжелых зависимостей после начала приема обновлений
+
+    До окончания прогрева всё работает как обычно, только первые запросы медленнее:
+    индекс продуктов еще не загружен (поиск идет через API), пул графиков запускается по требованию.
+    """
+
+    _task: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def start(cls):
+        """Запустить прогрев, не задерживая запуск бота"""
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls.run())
+
+    @classmethod
+    async def wait(cls):
+        if cls._task is not None:
+            await asyncio.gather(cls._task, return_exceptions=True)
+
+    @classmethod
+    async def stop(cls):
+        if cls._task is not None and not cls._task.done():
+            cls._task.cancel()
+        await cls.wait()
+        cls._task = None
+
+    @classmethod
+    async def run(cls):
+        steps = (
+            ('прогрев: индекс продуктов', NutritionAPI.get_index),
+            ('прогрев: кэш продуктов', lambda: asyncio.to_thread(NutritionAPI.get_cache)),
+            ('прогрев: пул графиков', ChartRenderer.warm_up)
+        )
+        for name, step in steps:
+            with profiler.phase(name):
+                try:
+                    await step()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Ошибка прогрева ({name}): {e}")
+        logger.info(f"Прогрев завершен через {profiler.elapsed_ms():.0f} мс после запуска")
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from config import config
+from services.calculator import Calculator
+from services.day_rollover import DayRollover
+from services.weather_api import WeatherAPI
+from utils.storage import storage
+
+logger = logging.getLogger(__name__)
+
+class WaterGoalUpdater:
+    """Периодическое обновление температуры и нормы воды, сгруппированное по городам"""
+
+    _task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def group_by_city() -> Dict[str, Tuple[str, List[int]]]:
+        """Сгруппировать пользователей по городу: ключ -> (город, [user_id])"""
+        groups: Dict[str, Tuple[str, List[int]]] = {}
+        for user_id, user_data in list(storage.users.items()):
+            city = user_data.get('city')
+            if not city:
+                continue
+            key = WeatherAPI.normalize_city(city)
+            if key not in groups:
+                groups[key] = (city, [])
+            groups[key][1].append(user_id)
+        return groups
+
+    @staticmethod
+    async def refresh_all() -> Dict[str, int]:
+        """Получить погоду один раз на город и пересчитать нормы воды всех пользователей
+
+        Заодно пользователям без часового пояса (профили, созданные до его появления
+        или при сбое погоды) проставляется пояс города из того же ответа.
+        """
+        groups = WaterGoalUpdater.group_by_city()
+        semaphore = asyncio.Semaphore(config.WEATHER_REFRESH_CONCURRENCY)
+
+        async def fetch(city: str) -> Tuple[Optional[float], Optional[int]]:
+            async with semaphore:
+                # Без настоящих данных (сбой API) город пропускается, а не получает температуру по умолчанию
+                temperature = await WeatherAPI.get_temperature(city, default=None)
+                # Тот же закэшированный ответ, второго запроса нет
+                return temperature, await WeatherAPI.get_utc_offset(city)
+
+        keys = list(groups)
+        results = await asyncio.gather(*(fetch(groups[key][0]) for key in keys))
+
+        calculator = Calculator()
+        updated = 0
+        offsets = 0
+        for key, (temperature, utc_offset) in zip(keys, results):
+            if temperature is None:
+                continue
+            for user_id in groups[key][1]:
+                user_data = storage.get_user(user_id)
+                if not user_data:
+                    continue
+                if utc_offset is not None and user_data.get('utc_offset') is None:
+                    DayRollover.set_offset(user_id, utc_offset)
+                    offsets += 1
+                if user_data.get('temperature') == temperature:
+                    continue
+                storage.update_user(user_id, {'temperature': temperature})
+                # Норма пересчитывается с сохранением добавок за сегодняшние тренировки
+                storage.update_water_goal_with_workouts(user_id, calculator)
+                updated += 1
+
+        stats = {'cities': len(keys), 'updated_users': updated, 'timezones_set': offsets}
+        logger.info(f"Обновление норм воды по погоде: {stats}")
+        return stats
+
+    @classmethod
+    async def _loop(cls):
+        while True:
+            await asyncio.sleep(config.WATER_GOAL_REFRESH_INTERVAL)
+            try:
+                await cls.refresh_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обновления норм воды: {e}")
+
+    @classmethod
+    async def start(cls):
+        """Запустить периодическое обновление (вызывается при старте бота)"""
+        if not config.OPENWEATHER_API_KEY:
+            return
+        if cls._task is None or cls._task.done():
+            cls._task = asyncio.create_task(cls._loop())
+
+    @classmethod
+    async def stop(cls):
+        """Остановить периодическое обновление"""
+        if cls._task is not None:
+            cls._task.cancel()
+            await asyncio.gather(cls._task, return_exceptions=True)
+            cls._task = None
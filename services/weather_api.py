@@ -1,69 +1,185 @@
+import time
+import asyncio
 import aiohttp
 import logging
-from typing import Dict, Optional
+from typing import Dict, Optional, Set, Tuple
 from config import config
+from utils.cache import LRUCache
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
 class WeatherAPI:
-    
+
+    WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+    _session: Optional[aiohttp.ClientSession] = None
+    _flight = SingleFlight()
+    # город -> (данные, время получения); запись живет TTL + окно stale
+    _cache = LRUCache(
+        maxsize=config.WEATHER_CACHE_SIZE,
+        ttl=config.WEATHER_CACHE_TTL + config.WEATHER_STALE_TTL
+    )
+    # город -> (название для запроса, время последнего обращения)
+    _last_access: Dict[str, Tuple[str, float]] = {}
+    _refresher: Optional[asyncio.Task] = None
+    _background: Set[asyncio.Task] = set()
+
     @staticmethod
-    async def get_temperature(city: str) -> Optional[float]:
-        """Получение температуры для города"""
+    def normalize_city(city: str) -> str:
+        """Нормализация названия города для ключа запроса"""
+        return ' '.join(city.lower().replace('ё', 'е').split())
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        """Общая сессия с пулом соединений (создается при первом запросе)"""
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=config.WEATHER_API_POOL_SIZE,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=config.WEATHER_API_TIMEOUT)
+            )
+        return cls._session
+
+    @classmethod
+    async def start_refresher(cls):
+        """Запустить фоновое обновление погоды в часто запрашиваемых городах"""
+        if cls._refresher is None or cls._refresher.done():
+            cls._refresher = asyncio.create_task(cls._refresh_loop())
+
+    @classmethod
+    async def close(cls):
+        """Остановить фоновые задачи и закрыть сессию (вызывается при остановке бота)"""
+        tasks = [task for task in (cls._refresher, *cls._background) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cls._refresher = None
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
+    @staticmethod
+    async def _fetch_weather(city: str) -> Optional[Dict]:
+        """Запрос текущей погоды в OpenWeatherMap"""
+        params = {
+            'q': city,
+            'appid': config.OPENWEATHER_API_KEY,
+            'units': 'metric',
+            'lang': 'ru'
+        }
         try:
-            api_key = config.OPENWEATHER_API_KEY
-            if not api_key:
-                logger.warning("OPENWEATHER_API_KEY не установлен")
-                return config.DEFAULT_TEMPERATURE
-            
-            url = "http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                'q': city,
-                'appid': api_key,
-                'units': 'metric',
-                'lang': 'ru'
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data['main']['temp']
-                    else:
-                        logger.warning(f"Не удалось получить погоду: {response.status}")
-                        return config.DEFAULT_TEMPERATURE
+            session = WeatherAPI.get_session()
+            async with session.get(WeatherAPI.WEATHER_URL, params=params) as response:
+                if response.status == 200:
+                    return await response.json()
+                logger.warning(f"Не удалось получить погоду: {response.status}")
+                return None
         except Exception as e:
             logger.error(f"Ошибка при получении погоды: {e}")
-            return config.DEFAULT_TEMPERATURE
-    
+            return None
+
+    @classmethod
+    async def _fetch_and_store(cls, key: str, city: str) -> Optional[Dict]:
+        data = await cls._fetch_weather(city)
+        if data is not None:
+            cls._cache.set(key, (data, time.monotonic()))
+        return data
+
+    @classmethod
+    async def _refresh(cls, key: str, city: str) -> Optional[Dict]:
+        """Обновить погоду города; одновременные запросы одного города объединяются"""
+        return await cls._flight.do(key, cls._fetch_and_store, key, city)
+
+    @classmethod
+    def _refresh_in_background(cls, key: str, city: str):
+        task = asyncio.ensure_future(cls._refresh(key, city))
+        cls._background.add(task)
+        task.add_done_callback(cls._background.discard)
+
+    @classmethod
+    async def fetch_weather(cls, city: str) -> Optional[Dict]:
+        """Погода для города из кэша; устаревшие данные отдаются сразу и обновляются в фоне"""
+        key = cls.normalize_city(city)
+        now = time.monotonic()
+        cls._last_access[key] = (city, now)
+
+        cached = cls._cache.get(key)
+        if cached is not None:
+            data, fetched_at = cached
+            if now - fetched_at >= config.WEATHER_CACHE_TTL:
+                cls._refresh_in_background(key, city)
+            return data
+
+        return await cls._refresh(key, city)
+
+    @classmethod
+    async def _refresh_loop(cls):
+        """Заранее обновлять погоду в городах, к которым недавно обращались"""
+        while True:
+            await asyncio.sleep(config.WEATHER_REFRESH_INTERVAL)
+            try:
+                now = time.monotonic()
+                refresh_before = config.WEATHER_CACHE_TTL - 2 * config.WEATHER_REFRESH_INTERVAL
+                hot = []
+                for key, (city, accessed_at) in list(cls._last_access.items()):
+                    if now - accessed_at > config.WEATHER_HOT_WINDOW:
+                        del cls._last_access[key]
+                        continue
+                    cached = cls._cache.get(key)
+                    if cached is None or now - cached[1] >= refresh_before:
+                        hot.append(cls._refresh(key, city))
+                if hot:
+                    await asyncio.gather(*hot)
+                    logger.info(f"Обновлена погода для городов: {len(hot)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления погоды: {e}")
+
+    @staticmethod
+    async def get_temperature(city: str, default: Optional[float] = config.DEFAULT_TEMPERATURE) -> Optional[float]:
+        """Получение температуры для города; default - если погоду узнать не удалось"""
+        if not config.OPENWEATHER_API_KEY:
+            logger.warning("OPENWEATHER_API_KEY не установлен")
+            return default
+
+        data = await WeatherAPI.fetch_weather(city)
+        try:
+            return data['main']['temp']
+        except (TypeError, KeyError):
+            return default
+
+    @staticmethod
+    async def get_utc_offset(city: str) -> Optional[int]:
+        """Смещение часового пояса города от UTC в секундах"""
+        if not config.OPENWEATHER_API_KEY:
+            return None
+
+        data = await WeatherAPI.fetch_weather(city)
+        try:
+            return int(data['timezone'])
+        except (TypeError, KeyError, ValueError):
+            return None
+
     @staticmethod
     async def get_weather_info(city: str) -> Optional[Dict]:
         """Получение полной информации о погоде"""
+        if not config.OPENWEATHER_API_KEY:
+            return None
+
+        data = await WeatherAPI.fetch_weather(city)
         try:
-            api_key = config.OPENWEATHER_API_KEY
-            if not api_key:
-                return None
-            
-            url = "http://api.openweathermap.org/data/2.5/weather"
-            params = {
-                'q': city,
-                'appid': api_key,
-                'units': 'metric',
-                'lang': 'ru'
+            return {
+                'temperature': data['main']['temp'],
+                'feels_like': data['main']['feels_like'],
+                'humidity': data['main']['humidity'],
+                'description': data['weather'][0]['description'],
+                'city': data['name']
             }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            'temperature': data['main']['temp'],
-                            'feels_like': data['main']['feels_like'],
-                            'humidity': data['main']['humidity'],
-                            'description': data['weather'][0]['description'],
-                            'city': data['name']
-                        }
+        except (TypeError, KeyError, IndexError):
             return None
-        except Exception as e:
-            logger.error(f"Ошибка при получении погоды: {e}")
-            return None
\ No newline at end of file
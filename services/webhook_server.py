@@ -0,0 +1,127 @@
+import asyncio
+import hmac
+import secrets
+import signal
+import logging
+from typing import Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from config import config
+from services.update_pipeline import PipelineOverloaded
+from services.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class WebhookServer:
+    """Прием обновлений через вебхук: aiohttp-приложение вместо long polling
+
+    Запрос подтверждается, как только обновление встало в очередь обработки
+    диспетчера (UpdatePipeline). Если очередь переполнена или бот останавливается,
+    обновление получает 503 и Telegram пришлет его повторно; уже принятые
+    дорабатываются при остановке в течение WEBHOOK_DRAIN_TIMEOUT секунд.
+    Состояние очереди отдается по GET {WEBHOOK_PATH}/stats с тем же секретом.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, secret_token: Optional[str] = None):
+        self.dp = dp
+        self.bot = bot
+        self.secret_token = secret_token or config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self._draining = False
+        self._runner: Optional[web.AppRunner] = None
+        self.stats = {'received': 0, 'rejected': 0, 'overloaded': 0, 'failed': 0}
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(config.WEBHOOK_PATH, self.handle)
+        app.router.add_get(config.WEBHOOK_PATH.rstrip('/') + '/stats', self.handle_stats)
+        return app
+
+    def _authorized(self, request: web.Request) -> bool:
+        token = request.headers.get(SECRET_HEADER, '')
+        if hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            return True
+        self.stats['rejected'] += 1
+        return False
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """Счетчики вебхука, очереди обработки и очереди исходящих (для мониторинга)"""
+        if not self._authorized(request):
+            return web.Response(status=401)
+        pipeline = self.dp.get('pipeline')
+        return web.json_response({
+            'webhook': self.stats,
+            'pipeline': pipeline.get_stats() if pipeline is not None else None,
+            'outbox': outbox.get_stats()
+        })
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Принять обновление от Telegram"""
+        if not self._authorized(request):
+            return web.Response(status=401)
+        if self._draining:
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={'bot': self.bot})
+        except Exception as e:
+            logger.warning(f"Некорректное обновление во вебхуке: {e}")
+            return web.Response(status=400)
+
+        self.stats['received'] += 1
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except PipelineOverloaded:
+            self.stats['overloaded'] += 1
+            return web.Response(status=503)
+        except Exception as e:
+            self.stats['failed'] += 1
+            logger.error(f"Ошибка приема обновления {update.update_id}: {e}")
+        return web.Response()
+
+    async def start(self):
+        """Запустить startup-хуки, HTTP-сервер и зарегистрировать вебхук в Telegram"""
+        await self.dp.emit_startup(bot=self.bot)
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT).start()
+        logger.info(f"Вебхук слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+
+        if config.WEBHOOK_URL:
+            await self.bot.set_webhook(
+                url=config.WEBHOOK_URL.rstrip('/') + config.WEBHOOK_PATH,
+                secret_token=self.secret_token,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+            logger.info("Вебхук зарегистрирован в Telegram")
+        else:
+            logger.warning("WEBHOOK_URL не установлен: вебхук не регистрируется, обновления можно присылать вручную")
+
+    async def stop(self):
+        """Перестать принимать обновления, доработать очередь и остановить бота"""
+        self._draining = True
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.dp.emit_shutdown(bot=self.bot)
+        await self.bot.session.close()
+        logger.info(f"Вебхук остановлен: {self.stats}")
+
+    async def run(self):
+        """Работать до SIGINT/SIGTERM, затем корректно остановиться"""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:
+                pass
+
+        await self.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await self.stop()
@@ -0,0 +1,76 @@
+import json
+import os
+import sqlite3
+import threading
+import logging
+from typing import Dict, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+class StorageBackend:
+    """Интерфейс постоянного хранилища профилей пользователей"""
+
+    def load_all(self) -> Dict[int, Dict]:
+        """Загрузить всех пользователей"""
+        return {}
+
+    def save_many(self, rows: Iterable[Tuple[int, str]]):
+        """Сохранить пачку пользователей (user_id, данные в JSON) одной транзакцией"""
+
+    def delete_many(self, user_ids: Iterable[int]):
+        """Удалить пользователей"""
+
+    def close(self):
+        """Закрыть хранилище"""
+
+class SQLiteBackend(StorageBackend):
+    """Хранилище профилей в SQLite (режим WAL)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load_all(self) -> Dict[int, Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, data FROM users").fetchall()
+        users = {}
+        for user_id, data in rows:
+            try:
+                users[user_id] = json.loads(data)
+            except json.JSONDecodeError as e:
+                logger.error(f"Поврежденные данные пользователя {user_id}: {e}")
+        return users
+
+    def save_many(self, rows: Iterable[Tuple[int, str]]):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)", rows
+                )
+
+    def delete_many(self, user_ids: Iterable[int]):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM users WHERE user_id = ?", ((user_id,) for user_id in user_ids)
+                )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_backend(name: str, path: str) -> StorageBackend:
+    """Создать хранилище по имени из настроек"""
+    if name == 'sqlite':
+        return SQLiteBackend(path)
+    return StorageBackend()
@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """LRU-кэш в памяти с ограничением по размеру и времени жизни записей"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Получить значение или None, если записи нет или она устарела"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Сохранить значение"""
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        """Удалить значение"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SQLiteCache:
+    """Кэш на диске (SQLite), переживает перезапуск бота
+
+    Методы блокирующие: из цикла событий их вызывают через asyncio.to_thread
+    (см. TwoTierCache), соединение защищено блокировкой от одновременных потоков.
+    """
+
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Получить значение или None, если записи нет или она устарела"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Сохранить значение"""
+        ttl = self.ttl if ttl is None else ttl
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, time.time() + ttl)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        """Удалить значение"""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class TwoTierCache:
+    """Двухуровневый кэш: LRU в памяти перед SQLite на диске
+
+    Память проверяется сразу, обращения к диску выполняются в отдельном потоке.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.stats: Dict[str, int] = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Получить значение, поднимая найденное на диске в память"""
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats['memory_hits'] += 1
+            return value
+
+        if self.disk is not None:
+            try:
+                value = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка чтения дискового кэша: {e}")
+                value = None
+            if value is not None:
+                self.stats['disk_hits'] += 1
+                self.memory.set(key, value)
+                return value
+
+        self.stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        """Сохранить значение в оба уровня"""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value)
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи в дисковый кэш: {e}")
+
+    def get_stats(self) -> Dict[str, float]:
+        """Статистика попаданий и промахов"""
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return {
+            **self.stats,
+            'hits': hits,
+            'hit_rate': (hits / total * 100) if total > 0 else 0
+        }
@@ -0,0 +1,69 @@
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+class ChartCache:
+    """LRU-кэш PNG-графиков по хешу входных данных с ограничением по объему в байтах"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._images: OrderedDict = OrderedDict()
+        self._owners: Dict[str, Set[int]] = {}
+        self._user_keys: Dict[int, Set[str]] = {}
+        self.stats: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    @staticmethod
+    def digest(kind: str, inputs: tuple) -> str:
+        """Ключ графика: хеш типа графика и его точных входных данных"""
+        return hashlib.blake2b(repr((kind, inputs)).encode(), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        image = self._images.get(key)
+        if image is None:
+            self.stats['misses'] += 1
+            return None
+        self._images.move_to_end(key)
+        self.stats['hits'] += 1
+        return image
+
+    def put(self, key: str, image: bytes, user_id: Optional[int] = None):
+        """Сохранить график; старые вытесняются, пока не уложимся в лимит"""
+        if not image or len(image) > self.max_bytes:
+            return
+        if key in self._images:
+            self.size -= len(self._images[key])
+        self._images[key] = image
+        self._images.move_to_end(key)
+        self.size += len(image)
+        if user_id is not None:
+            self._owners.setdefault(key, set()).add(user_id)
+            self._user_keys.setdefault(user_id, set()).add(key)
+
+        while self.size > self.max_bytes:
+            old_key, _ = next(iter(self._images.items()))
+            self._remove(old_key)
+            self.stats['evictions'] += 1
+
+    def _remove(self, key: str):
+        image = self._images.pop(key, None)
+        if image is not None:
+            self.size -= len(image)
+        for user_id in self._owners.pop(key, ()):
+            keys = self._user_keys.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._user_keys[user_id]
+
+    def invalidate_user(self, user_id: int):
+        """Удалить графики пользователя (вызывается при изменении его данных)"""
+        keys = self._user_keys.pop(user_id, None)
+        if not keys:
+            return
+        for key in keys:
+            self._remove(key)
+        self.stats['invalidations'] += 1
+
+    def __len__(self) -> int:
+        return len(self._images)
@@ -1,187 +1,79 @@
-import io
-import matplotlib
-matplotlib.use('Agg') 
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
+import importlib
+import logging
+from config import config
+
+logger = logging.getLogger(__name__)
+
+MAX_BARS = 7
+
+_BACKENDS = {
+    'raster': 'utils.raster_charts',
+    'matplotlib': 'utils.mpl_charts'
+}
+_backend = None
+
+def get_backend():
+    """Модуль отрисовки из CHART_BACKEND; без matplotlib - встроенный растровый"""
+    global _backend
+    if _backend is None:
+        name = config.CHART_BACKEND if config.CHART_BACKEND in _BACKENDS else 'raster'
+        try:
+            _backend = importlib.import_module(_BACKENDS[name])
+        except ImportError as e:
+            logger.warning(f"Бэкенд графиков {name} недоступен ({e}), используется raster")
+            _backend = importlib.import_module(_BACKENDS['raster'])
+    return _backend
+
+def _last_week(user_data: dict, metric: str):
+    history = user_data.get('history')
+    dates, values = history.last(MAX_BARS) if history else ([], {})
+    return [day.strftime('%d.%m') for day in dates], values.get(metric, [])
+
+def _macro_args(totals: dict) -> tuple:
+    if not totals.get('food_count'):
+        return ([0, 0, 0], 'Нет данных\nо питании')
+    return ([totals['protein'], totals['carbs'], totals['fat']],)
 
 class Charts:
-    """Простой класс для создания графиков без сложных настроек"""
-    
+    """Графики в PNG: встроенный растровый бэкенд или matplotlib, безопасно вызывать из разных потоков"""
+
     @staticmethod
     def create_water_chart(user_data: dict) -> bytes:
-        """Создать простой график воды"""
+        """Создать график воды за последние 7 дней"""
         try:
-            fig, ax = plt.subplots(figsize=(8, 4))
-            
-            # Получаем историю воды
-            water_history = user_data.get('water_history', {})
-            if isinstance(water_history, list):
-                # Конвертируем список в словарь
-                water_dict = {}
-                for entry in water_history[-7:]:
-                    if isinstance(entry, dict):
-                        water_dict[entry.get('date', '')] = entry.get('amount', 0)
-                water_history = water_dict
-            
-            if water_history:
-                dates = sorted(water_history.keys())[-7:]
-                amounts = [water_history[date] for date in dates]
-                
-                # Создаем простые метки (только день)
-                simple_dates = []
-                for date_str in dates:
-                    try:
-                        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                        simple_dates.append(date_obj.strftime('%d.%m'))
-                    except:
-                        simple_dates.append(date_str[:5])
-                
-                ax.bar(simple_dates, amounts, color='lightblue')
-                ax.set_xlabel('Дата')
-                ax.set_ylabel('Вода (мл)')
-                ax.set_title('Потребление воды')
-                
-                # Целевая линия
-                goal = user_data.get('water_goal')
-                if goal:
-                    ax.axhline(y=goal, color='red', linestyle='--', alpha=0.5)
-            
-            else:
-                ax.text(0.5, 0.5, 'Нет данных о воде', 
-                       ha='center', va='center', fontsize=14)
-            
-            plt.tight_layout()
-            
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=80)
-            buf.seek(0)
-            plt.close(fig)
-            return buf.getvalue()
-            
+            labels, values = _last_week(user_data, 'water')
+            return get_backend().render('water', labels, values, user_data.get('water_goal'))
         except Exception as e:
-            print(f"Ошибка при создании графика воды: {e}")
+            logger.error(f"Ошибка при создании графика воды: {e}")
             return b''
-    
+
     @staticmethod
     def create_calories_chart(user_data: dict) -> bytes:
-        """Создать простой график калорий"""
+        """Создать график калорий за последние 7 дней"""
+        try:
+            labels, values = _last_week(user_data, 'calories')
+            return get_backend().render('calories', labels, values, user_data.get('calorie_goal'))
+        except Exception as e:
+            logger.error(f"Ошибка при создании графика калорий: {e}")
+            return b''
+
+    @staticmethod
+    def create_macros_chart(totals: dict) -> bytes:
+        """Создать график макронутриентов по дневным итогам"""
         try:
-            plt.close('all')  
-            fig, ax = plt.subplots(figsize=(8, 4))
-            calorie_history = user_data.get('calorie_history', {})
-            
-            processed_data = {}
-            
-            if isinstance(calorie_history, list):
-                recent_entries = calorie_history[-7:] if calorie_history else []
-                for entry in recent_entries:
-                    if isinstance(entry, dict):
-                        date_val = entry.get('date', '')
-                        calories_val = entry.get('calories', 0)
-                        if date_val:
-                            processed_data[date_val] = calories_val
-            elif isinstance(calorie_history, dict):
-                sorted_dates = sorted(calorie_history.keys())
-                recent_dates = sorted_dates[-7:] if sorted_dates else []
-                for date in recent_dates:
-                    processed_data[date] = calorie_history.get(date, 0)
-            
-            if processed_data:
-                dates = sorted(processed_data.keys())
-                calories = [processed_data[date] for date in dates]
-                
-                formatted_dates = []
-                for date_str in dates:
-                    try:
-                        date_obj = datetime.strptime(str(date_str), '%Y-%m-%d')
-                        formatted_dates.append(date_obj.strftime('%d.%m'))
-                    except (ValueError, TypeError):
-                        formatted_dates.append(str(date_str)[:5])
-                
-                bars = ax.bar(formatted_dates, calories, color='orange', alpha=0.7)
-                ax.set_xlabel('Дата')
-                ax.set_ylabel('Калории (ккал)')
-                ax.set_title('Потребление калорий')
-                
-                goal = user_data.get('calorie_goal')
-                if goal and isinstance(goal, (int, float)):
-                    ax.axhline(y=goal, color='red', linestyle='--', alpha=0.5, 
-                            label=f'Цель: {goal} ккал')
-                    ax.legend()
-                
-                plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
-                
-            else:
-                ax.text(0.5, 0.5, 'Нет данных о калориях', 
-                    ha='center', va='center', fontsize=14, 
-                    transform=ax.transAxes)
-                ax.set_xticks([])
-                ax.set_yticks([])
-            
-            fig.tight_layout()
-            
-            buf = io.BytesIO()
-            fig.savefig(buf, format='png', dpi=80, bbox_inches='tight')
-            buf.seek(0)
-            
-            plt.close(fig)
-            
-            return buf.getvalue()
-        
+            return get_backend().render('macros', *_macro_args(totals))
         except Exception as e:
-            print(f"Ошибка при создании графика калорий: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.error(f"Ошибка при создании графика макронутриентов: {e}")
             return b''
-    
+
     @staticmethod
-    def create_macros_chart(food_log: list) -> bytes:
-        """Создать простой график макронутриентов"""
+    def create_dashboard(user_data: dict) -> bytes:
+        """Создать сводную картинку: вода, калории и макронутриенты (итоги в user_data['totals'])"""
         try:
-            fig, ax = plt.subplots(figsize=(6, 6))
-            
-            if not food_log:
-                ax.text(0.5, 0.5, 'Нет данных\nо питании', 
-                       ha='center', va='center', fontsize=14)
-                ax.axis('off')
-            else:
-                # Считаем макронутриенты
-                protein = sum(food.get('protein', 0) for food in food_log)
-                carbs = sum(food.get('carbs', 0) for food in food_log)
-                fat = sum(food.get('fat', 0) for food in food_log)
-                
-                # Создаем данные для круговой диаграммы
-                labels = ['Белки', 'Углеводы', 'Жиры']
-                sizes = [protein, carbs, fat]
-                colors = ['lightgreen', 'gold', 'lightcoral']
-                
-                filtered_labels = []
-                filtered_sizes = []
-                filtered_colors = []
-                
-                for label, size, color in zip(labels, sizes, colors):
-                    if size > 0:
-                        filtered_labels.append(label)
-                        filtered_sizes.append(size)
-                        filtered_colors.append(color)
-                
-                if filtered_sizes:
-                    ax.pie(filtered_sizes, labels=filtered_labels, colors=filtered_colors,
-                          autopct='%1.1f%%', startangle=90)
-                    ax.set_title('Макронутриенты')
-                else:
-                    ax.text(0.5, 0.5, 'Нет данных\nо макронутриентах', 
-                           ha='center', va='center', fontsize=14)
-                    ax.axis('off')
-            
-            plt.tight_layout()
-            
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=80)
-            buf.seek(0)
-            plt.close(fig)
-            return buf.getvalue()
-            
+            water = (*_last_week(user_data, 'water'), user_data.get('water_goal'))
+            calories = (*_last_week(user_data, 'calories'), user_data.get('calorie_goal'))
+            macros = _macro_args(user_data.get('totals') or {})
+            return get_backend().render('dashboard', water, calories, macros)
         except Exception as e:
-            print(f"Ошибка при создании графика макронутриентов: {e}")
-            return b''
\ No newline at end of file
+            logger.error(f"Ошибка при создании сводного графика: {e}")
+            return b''
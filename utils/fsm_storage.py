@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import asyncio
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class SQLiteFSMStorage(BaseStorage):
+    """Состояния диалогов (FSM) в SQLite, чтобы перезапуск не обрывал /set_profile, /log_food и /log_workout
+
+    Горячие ключи живут в LRU-кэше в памяти, изменения копятся и пишутся одной
+    транзакцией раз в flush_interval_ms в отдельном потоке. Ключ, вытесненный
+    из кэша до записи, читается из очереди на запись (или из пачки, которая
+    пишется прямо сейчас), а не с диска.
+    """
+
+    def __init__(self, path: str, cache_size: int = 10000, flush_interval_ms: int = 200):
+        self.path = path
+        self.cache_size = cache_size
+        self.flush_interval_ms = flush_interval_ms
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # ключ -> [состояние, данные]
+        self._cache: OrderedDict = OrderedDict()
+        # ключ -> (состояние, данные) на момент последнего изменения, ждет записи
+        self._dirty: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        # пачка, которая сейчас пишется в потоке: до конца записи на диске ее еще нет
+        self._flushing: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm (key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    async def start(self):
+        """Запустить фоновую запись (вызывается при старте бота)"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Записать накопленные изменения; база остается открытой
+
+        aiogram вызывает close первым хуком остановки, пока обновления из очереди
+        еще дорабатываются и пишут состояния. Закрывает базу stop, последним хуком.
+        """
+        await self.flush()
+
+    async def stop(self):
+        """Остановить фоновую запись, записать изменения и закрыть базу (вызывается при остановке бота)"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        logger.info(f"Статистика хранилища диалогов: {self.stats}")
+        with self._lock:
+            self._conn.close()
+
+    def _load(self, key: str) -> List:
+        with self._lock:
+            row = self._conn.execute("SELECT state, data FROM fsm WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return [None, {}]
+        try:
+            return [row[0], json.loads(row[1])]
+        except json.JSONDecodeError as e:
+            logger.error(f"Поврежденное состояние диалога {key}: {e}")
+            return [None, {}]
+
+    async def _entry(self, storage_key: StorageKey) -> Tuple[str, List]:
+        key = self._key_builder.build(storage_key)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+            self.stats['hits'] += 1
+            return key, entry
+
+        self.stats['misses'] += 1
+        pending = self._dirty.get(key)
+        if pending is None:
+            pending = self._flushing.get(key)
+        if pending is not None:
+            entry = [pending[0], dict(pending[1])]
+        else:
+            entry = await asyncio.to_thread(self._load, key)
+            # Пока шло чтение, ключ мог попасть в кэш из другого обработчика
+            cached = self._cache.get(key)
+            if cached is not None:
+                return key, cached
+
+        self._cache[key] = entry
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return key, entry
+
+    def _mark_dirty(self, key: str, entry: List):
+        self._dirty[key] = (entry[0], dict(entry[1]))
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        key, entry = await self._entry(key)
+        entry[0] = state.state if isinstance(state, State) else state
+        self._mark_dirty(key, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        _, entry = await self._entry(key)
+        return entry[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        key, entry = await self._entry(key)
+        entry[1] = dict(data)
+        self._mark_dirty(key, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, entry = await self._entry(key)
+        return dict(entry[1])
+
+    def _write(self, upserts: List[Tuple[str, Optional[str], str]], deletes: List[Tuple[str]]):
+        with self._lock:
+            with self._conn:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO fsm (key, state, data) VALUES (?, ?, ?)", upserts
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+
+    async def flush(self):
+        """Записать изменения одной транзакцией вне цикла событий; завершенные диалоги удаляются"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        self._flushing = dirty
+        upserts, deletes = [], []
+        for key, (state, data) in dirty.items():
+            if state is None and not data:
+                deletes.append((key,))
+                continue
+            try:
+                upserts.append((key, state, json.dumps(data, ensure_ascii=False)))
+            except (TypeError, ValueError) as e:
+                logger.error(f"Состояние диалога {key} не сериализуется в JSON: {e}")
+        try:
+            await asyncio.to_thread(self._write, upserts, deletes)
+            self.stats['writes'] += 1
+        except Exception as e:
+            logger.error(f"Ошибка записи состояний диалогов: {e}")
+            # Более свежие изменения, сделанные во время записи, не затираем
+            for key, value in dirty.items():
+                self._dirty.setdefault(key, value)
+        finally:
+            self._flushing = {}
+
+    async def _flush_loop(self):
+        """Групповая запись изменений раз в flush_interval_ms"""
+        while True:
+            await asyncio.sleep(self.flush_interval_ms / 1000)
+            await self.flush()
+
+def create_fsm_storage() -> BaseStorage:
+    """Создать хранилище диалогов по настройкам"""
+    if config.FSM_STORAGE == 'sqlite':
+        return SQLiteFSMStorage(
+            config.FSM_DB,
+            cache_size=config.FSM_CACHE_SIZE,
+            flush_interval_ms=config.STORAGE_FLUSH_INTERVAL_MS
+        )
+    return MemoryStorage()
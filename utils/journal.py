@@ -0,0 +1,157 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class EventJournal:
+    """Журнал изменений (append-only) со снимками состояния для восстановления после сбоя
+
+    События пишутся в сегменты journal-<seq>.log, fsync выполняется пачками.
+    Снимок копируется по пользователям порциями, не останавливая цикл событий:
+    для каждого пользователя запоминается seq на момент его копирования, а seq
+    снимка - момент начала. Снимок начинает новый сегмент, сегменты, целиком
+    вошедшие в снимок, удаляются. При старте загружается снимок и проигрывается
+    хвост журнала после него, кроме событий, уже учтенных в копии пользователя.
+    """
+
+    SNAPSHOT_FILE = "snapshot.json"
+
+    def __init__(self, directory: str, json_default: Optional[Callable] = None):
+        self.directory = directory
+        self.json_default = json_default
+        os.makedirs(directory, exist_ok=True)
+        self.seq = 0
+        self.events_since_snapshot = 0
+        self._buffer: List[str] = []
+        self._file = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _segment_path(self, start_seq: int) -> str:
+        return os.path.join(self.directory, f"journal-{start_seq:012d}.log")
+
+    def _segments(self) -> List[str]:
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith("journal-") and name.endswith(".log")
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def recover(self) -> Tuple[Dict[int, Dict], List[Dict]]:
+        """Загрузить последний снимок и события после него"""
+        users: Dict[int, Dict] = {}
+        user_seqs: Dict[int, int] = {}
+        snapshot_seq = 0
+        snapshot_path = os.path.join(self.directory, self.SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            snapshot_seq = snapshot['seq']
+            users = {int(user_id): data for user_id, data in snapshot['users'].items()}
+            user_seqs = {int(user_id): seq for user_id, seq in snapshot.get('user_seqs', {}).items()}
+
+        events = []
+        self.seq = snapshot_seq
+        for path in self._segments():
+            # Конец последней целой строки: после сбоя в конце сегмента может остаться недописанная
+            valid_size = 0
+            torn = False
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("нет конца строки")
+                        event = json.loads(line)
+                    except ValueError:
+                        torn = True
+                        break
+                    valid_size += len(line)
+                    if event['seq'] > snapshot_seq:
+                        self.seq = event['seq']
+                        if event['seq'] > user_seqs.get(event.get('user_id'), 0):
+                            events.append(event)
+            if torn:
+                # Отрезаем ее, иначе новые события допишутся в ту же строку и тоже не прочитаются
+                logger.warning(f"Обрезанная запись в журнале {path}: удалена")
+                os.truncate(path, valid_size)
+
+        self.events_since_snapshot = self.seq - snapshot_seq
+        self._file = open(self._segment_path(self.seq + 1), 'a', encoding='utf-8')
+        logger.info(f"Восстановлено из журнала: снимок seq={snapshot_seq}, событий в хвосте: {len(events)}")
+        return users, events
+
+    def append(self, op: str, **fields):
+        """Добавить событие в буфер (записывается на диск при flush)"""
+        self.seq += 1
+        self.events_since_snapshot += 1
+        self._buffer.append(json.dumps({'seq': self.seq, 'op': op, **fields}, ensure_ascii=False) + "\n")
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _write(self, lines: List[str]):
+        if not lines:
+            return
+        self._file.write(''.join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def flush(self):
+        """Записать накопленные события одним fsync вне цикла событий"""
+        async with self._get_lock():
+            lines, self._buffer = self._buffer, []
+            await asyncio.to_thread(self._write, lines)
+
+    def _write_snapshot(self, lines: List[str], users: Dict[int, Dict], user_seqs: Dict[int, int],
+                        seq: int, last_seq: int):
+        self._write(lines)
+        data = json.dumps(
+            {'seq': seq, 'user_seqs': user_seqs, 'users': users},
+            ensure_ascii=False, default=self.json_default
+        )
+
+        snapshot_path = os.path.join(self.directory, self.SNAPSHOT_FILE)
+        tmp_path = snapshot_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+
+        new_path = self._segment_path(last_seq + 1)
+        if new_path != self._file.name:
+            old_file = self._file
+            self._file = open(new_path, 'a', encoding='utf-8')
+            old_file.close()
+        # Сегмент кончается перед началом следующего; события после seq снимку нужны
+        segments = self._segments()
+        for path, next_path in zip(segments, segments[1:]):
+            if self._start_seq(next_path) - 1 <= seq:
+                os.remove(path)
+
+    @staticmethod
+    def _start_seq(path: str) -> int:
+        return int(os.path.basename(path)[len("journal-"):-len(".log")])
+
+    async def snapshot(self, users: Dict[int, Dict], user_seqs: Dict[int, int], seq: int):
+        """Сохранить снимок состояния и удалить журнал, целиком вошедший в него
+
+        users - копии пользователей, которые можно сериализовать в другом потоке,
+        user_seqs - seq на момент копирования каждого, seq - момент начала копирования.
+        JSON строится и пишется в отдельном потоке.
+        """
+        async with self._get_lock():
+            lines, self._buffer = self._buffer, []
+            last_seq = self.seq
+            self.events_since_snapshot = last_seq - seq
+            await asyncio.to_thread(self._write_snapshot, lines, users, user_seqs, seq, last_seq)
+        logger.info(f"Сохранен снимок состояния seq={seq}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
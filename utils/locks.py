@@ -0,0 +1,18 @@
+import asyncio
+from typing import Hashable, List
+
+class StripedLock:
+    """Набор асинхронных блокировок, ключ (user_id) закреплен за одной из них
+
+    Обновления одного пользователя выполняются по очереди, разных - параллельно,
+    кроме редких совпадений полосы. Память не растет с числом пользователей.
+    """
+
+    def __init__(self, stripes: int = 1024):
+        self._locks: List[asyncio.Lock] = [asyncio.Lock() for _ in range(stripes)]
+
+    def __call__(self, key: Hashable) -> asyncio.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    def __len__(self) -> int:
+        return len(self._locks)
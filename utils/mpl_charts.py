@@ -0,0 +1,147 @@
+"""Качественные графики на объектном API matplotlib (CHART_BACKEND=matplotlib)"""
+import io
+import threading
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from utils.charts import MAX_BARS
+
+class _BarPanel:
+    """Столбчатая диаграмма на готовых осях: столбцы, подписи и линия цели создаются один раз,
+    при отрисовке меняются только высоты столбцов, подписи дат и линия цели"""
+
+    def __init__(self, ax, title: str, ylabel: str, color: str, alpha: float, empty_text: str, goal_legend: bool):
+        self.ax = ax
+        self.goal_legend = goal_legend
+        self.ax.set_xlabel('Дата')
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_title(title)
+
+        self.bars = self.ax.bar(range(MAX_BARS), [0] * MAX_BARS, color=color, alpha=alpha)
+        self.goal_line = self.ax.axhline(y=0, color='red', linestyle='--', alpha=0.5)
+        self.legend = None
+        self.empty = self.ax.text(0.5, 0.5, empty_text, ha='center', va='center',
+                                  fontsize=14, transform=self.ax.transAxes)
+
+    def update(self, labels: list, values: list, goal):
+        has_data = bool(labels)
+        self.empty.set_visible(not has_data)
+
+        for index, bar in enumerate(self.bars):
+            visible = index < len(values)
+            bar.set_visible(visible)
+            bar.set_height(values[index] if visible else 0)
+
+        has_goal = has_data and isinstance(goal, (int, float)) and goal > 0
+        self.goal_line.set_visible(has_goal)
+        if has_goal:
+            self.goal_line.set_ydata([goal, goal])
+
+        if self.goal_legend:
+            if self.legend is not None:
+                self.legend.remove()
+                self.legend = None
+            if has_goal:
+                self.goal_line.set_label(f'Цель: {goal} ккал')
+                self.legend = self.ax.legend(handles=[self.goal_line], loc='upper left')
+
+        if has_data:
+            if self.goal_legend:
+                self.ax.set_xticks(range(len(labels)), labels, rotation=45, ha='right')
+            else:
+                self.ax.set_xticks(range(len(labels)), labels)
+            self.ax.set_xlim(-0.6, len(labels) - 0.4)
+            top = max(max(values, default=0), goal if has_goal else 0)
+            self.ax.set_ylim(0, top * 1.1 if top > 0 else 1)
+            self.ax.tick_params(left=True, labelleft=True)
+        else:
+            self.ax.set_xticks([])
+            self.ax.set_ylim(0, 1)
+            self.ax.tick_params(left=False, labelleft=False)
+
+class _PiePanel:
+    """Круговая диаграмма макронутриентов на готовых осях"""
+
+    LABELS = ('Белки', 'Углеводы', 'Жиры')
+    COLORS = ('lightgreen', 'gold', 'lightcoral')
+
+    def __init__(self, ax):
+        self.ax = ax
+
+    def update(self, sizes: list, empty_text: str = 'Нет данных\nо макронутриентах'):
+        self.ax.clear()
+        filtered = [(label, size, color) for label, size, color in zip(self.LABELS, sizes, self.COLORS) if size > 0]
+        if filtered:
+            labels, values, colors = zip(*filtered)
+            self.ax.pie(values, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90)
+            self.ax.set_title('Макронутриенты')
+        else:
+            self.ax.text(0.5, 0.5, empty_text, ha='center', va='center', fontsize=14)
+            self.ax.axis('off')
+
+def _new_figure(figsize: tuple) -> Figure:
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+def _water_panel(ax) -> _BarPanel:
+    return _BarPanel(ax, 'Потребление воды', 'Вода (мл)', 'lightblue', 1.0,
+                     'Нет данных о воде', goal_legend=False)
+
+def _calories_panel(ax) -> _BarPanel:
+    return _BarPanel(ax, 'Потребление калорий', 'Калории (ккал)', 'orange', 0.7,
+                     'Нет данных о калориях', goal_legend=True)
+
+class _ChartTemplate:
+    """Отдельная фигура с одной панелью"""
+
+    def __init__(self, figsize: tuple, make_panel, margins: dict = None):
+        self.fig = _new_figure(figsize)
+        if margins:
+            self.fig.subplots_adjust(**margins)
+        self.panel = make_panel(self.fig.add_subplot())
+
+    def render(self, *args) -> bytes:
+        self.panel.update(*args)
+        return _to_png(self.fig)
+
+class _DashboardTemplate:
+    """Сводная фигура: вода и калории сверху, макронутриенты снизу"""
+
+    def __init__(self):
+        self.fig = _new_figure((12, 10))
+        self.fig.subplots_adjust(left=0.07, right=0.97, top=0.95, bottom=0.05, hspace=0.35, wspace=0.2)
+        grid = self.fig.add_gridspec(2, 2)
+        self.water = _water_panel(self.fig.add_subplot(grid[0, 0]))
+        self.calories = _calories_panel(self.fig.add_subplot(grid[0, 1]))
+        self.macros = _PiePanel(self.fig.add_subplot(grid[1, :]))
+
+    def render(self, water: tuple, calories: tuple, macros: tuple) -> bytes:
+        self.water.update(*water)
+        self.calories.update(*calories)
+        self.macros.update(*macros)
+        return _to_png(self.fig)
+
+def _to_png(fig: Figure) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=80)
+    return buf.getvalue()
+
+# Заготовки свои у каждого потока: фигуры не разделяются между потоками
+_local = threading.local()
+
+def _templates() -> dict:
+    templates = getattr(_local, 'templates', None)
+    if templates is None:
+        margins = {'left': 0.1, 'right': 0.97, 'top': 0.9, 'bottom': 0.2}
+        templates = {
+            'water': _ChartTemplate((8, 4), _water_panel, margins),
+            'calories': _ChartTemplate((8, 4), _calories_panel, margins),
+            'macros': _ChartTemplate((6, 6), _PiePanel),
+            'dashboard': _DashboardTemplate()
+        }
+        _local.templates = templates
+    return templates
+
+def render(kind: str, *args) -> bytes:
+    """Отрисовать график на заготовке текущего потока"""
+    return _templates()[kind].render(*args)
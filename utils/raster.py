@@ -0,0 +1,185 @@
+import struct
+import zlib
+from typing import Iterable, Sequence, Tuple
+
+Color = Tuple[int, int, int]
+
+WHITE: Color = (255, 255, 255)
+BLACK: Color = (0, 0, 0)
+
+GLYPH_WIDTH = 5
+GLYPH_HEIGHT = 7
+
+# Растровый шрифт 5x7: цифры, знаки и заглавная кириллица (строка глифа - 7 рядов по 5 точек)
+_FONT_SOURCE = {
+    ' ': '..... ..... ..... ..... ..... ..... .....',
+    '0': '.###. #...# #..## #.#.# ##..# #...# .###.',
+    '1': '..#.. .##.. ..#.. ..#.. ..#.. ..#.. .###.',
+    '2': '.###. #...# ....# ...#. ..#.. .#... #####',
+    '3': '##### ...#. ..#.. ...#. ....# #...# .###.',
+    '4': '...#. ..##. .#.#. #..#. ##### ...#. ...#.',
+    '5': '##### #.... ####. ....# ....# #...# .###.',
+    '6': '..##. .#... #.... ####. #...# #...# .###.',
+    '7': '##### ....# ...#. ..#.. .#... .#... .#...',
+    '8': '.###. #...# #...# .###. #...# #...# .###.',
+    '9': '.###. #...# #...# .#### ....# ...#. .##..',
+    '.': '..... ..... ..... ..... ..... .##.. .##..',
+    ',': '..... ..... ..... ..... .##.. ..#.. .#...',
+    ':': '..... .##.. .##.. ..... .##.. .##.. .....',
+    '%': '##... ##..# ...#. ..#.. .#... #..## ...##',
+    '-': '..... ..... ..... ##### ..... ..... .....',
+    '+': '..... ..#.. ..#.. ##### ..#.. ..#.. .....',
+    '(': '...#. ..#.. .#... .#... .#... ..#.. ...#.',
+    ')': '.#... ..#.. ...#. ...#. ...#. ..#.. .#...',
+    '/': '..... ....# ...#. ..#.. .#... #.... .....',
+    '?': '.###. #...# ....# ...#. ..#.. ..... ..#..',
+    'А': '.###. #...# #...# ##### #...# #...# #...#',
+    'Б': '##### #.... #.... ####. #...# #...# ####.',
+    'В': '####. #...# #...# ####. #...# #...# ####.',
+    'Г': '##### #.... #.... #.... #.... #.... #....',
+    'Д': '..##. .#.#. .#.#. .#.#. .#.#. ##### #...#',
+    'Е': '##### #.... #.... ####. #.... #.... #####',
+    'Ё': '.#.#. ..... ##### #.... ####. #.... #####',
+    'Ж': '#.#.# #.#.# .###. ..#.. .###. #.#.# #.#.#',
+    'З': '.###. #...# ....# ..##. ....# #...# .###.',
+    'И': '#...# #...# #..## #.#.# ##..# #...# #...#',
+    'Й': '.#.#. ..#.. #...# #..## #.#.# ##..# #...#',
+    'К': '#...# #..#. #.#.. ##... #.#.. #..#. #...#',
+    'Л': '..### .#..# .#..# .#..# .#..# .#..# #...#',
+    'М': '#...# ##.## #.#.# #.#.# #...# #...# #...#',
+    'Н': '#...# #...# #...# ##### #...# #...# #...#',
+    'О': '.###. #...# #...# #...# #...# #...# .###.',
+    'П': '##### #...# #...# #...# #...# #...# #...#',
+    'Р': '####. #...# #...# ####. #.... #.... #....',
+    'С': '.###. #...# #.... #.... #.... #...# .###.',
+    'Т': '##### ..#.. ..#.. ..#.. ..#.. ..#.. ..#..',
+    'У': '#...# #...# #...# .#### ....# #...# .###.',
+    'Ф': '..#.. .###. #.#.# #.#.# #.#.# .###. ..#..',
+    'Х': '#...# #...# .#.#. ..#.. .#.#. #...# #...#',
+    'Ц': '#..#. #..#. #..#. #..#. #..#. ##### ....#',
+    'Ч': '#...# #...# #...# .#### ....# ....# ....#',
+    'Ш': '#.#.# #.#.# #.#.# #.#.# #.#.# #.#.# #####',
+    'Щ': '#.#.# #.#.# #.#.# #.#.# #.#.# ##### ....#',
+    'Ъ': '##... .#... .#... .###. .#..# .#..# .###.',
+    'Ы': '#...# #...# #...# ##..# #.#.# #.#.# ##..#',
+    'Ь': '#.... #.... #.... ####. #...# #...# ####.',
+    'Э': '.###. #...# ....# .#### ....# #...# .###.',
+    'Ю': '#..#. #.#.# #.#.# ###.# #.#.# #.#.# #..#.',
+    'Я': '.#### #...# #...# .#### ..#.# .#..# #...#',
+}
+
+# Латиница, совпадающая по начертанию с кириллицей
+_LATIN_ALIASES = str.maketrans('ABCEHKMOPTXY', 'АВСЕНКМОРТХУ')
+
+def _parse_font() -> dict:
+    font = {}
+    for char, rows in _FONT_SOURCE.items():
+        # Для каждого ряда - список (столбец, длина) сплошных отрезков
+        font[char] = tuple(
+            tuple((start, len(run)) for start, run in _runs(row))
+            for row in rows.split()
+        )
+    return font
+
+def _runs(row: str):
+    start = None
+    for index, point in enumerate(row + '.'):
+        if point == '#' and start is None:
+            start = index
+        elif point != '#' and start is not None:
+            yield start, row[start:index]
+            start = None
+
+_FONT = _parse_font()
+
+def text_width(text: str, scale: int = 1) -> int:
+    """Ширина надписи в пикселях"""
+    if not text:
+        return 0
+    return (len(text) * (GLYPH_WIDTH + 1) - 1) * scale
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+class Canvas:
+    """RGB-холст в bytearray: прямоугольники, многоугольники, растровый текст и кодирование в PNG"""
+
+    def __init__(self, width: int, height: int, background: Color = WHITE):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(bytes(background) * (width * height))
+
+    def fill_rect(self, x: int, y: int, width: int, height: int, color: Color):
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(self.width, int(x + width)), min(self.height, int(y + height))
+        if x0 >= x1 or y0 >= y1:
+            return
+        span = bytes(color) * (x1 - x0)
+        stride = self.width * 3
+        offset = y0 * stride + x0 * 3
+        for _ in range(y0, y1):
+            self.pixels[offset:offset + len(span)] = span
+            offset += stride
+
+    def hline(self, x0: int, x1: int, y: int, color: Color, width: int = 1, dash: int = 0):
+        """Горизонтальная линия; dash > 0 - пунктир с таким шагом"""
+        if not dash:
+            self.fill_rect(x0, y, x1 - x0, width, color)
+            return
+        for x in range(int(x0), int(x1), dash * 2):
+            self.fill_rect(x, y, min(dash, x1 - x), width, color)
+
+    def vline(self, x: int, y0: int, y1: int, color: Color, width: int = 1):
+        self.fill_rect(x, y0, width, y1 - y0, color)
+
+    def fill_polygon(self, points: Sequence[Tuple[float, float]], color: Color):
+        """Закрасить многоугольник построчно (правило чет-нечет)"""
+        edges = [(points[i], points[(i + 1) % len(points)]) for i in range(len(points))]
+        top = max(0, int(min(y for _, y in points)))
+        bottom = min(self.height, int(max(y for _, y in points)) + 1)
+        for row in range(top, bottom):
+            center = row + 0.5
+            crossings = []
+            for (ax, ay), (bx, by) in edges:
+                if (ay <= center < by) or (by <= center < ay):
+                    crossings.append(ax + (center - ay) * (bx - ax) / (by - ay))
+            crossings.sort()
+            for left, right in zip(crossings[::2], crossings[1::2]):
+                start = int(left + 0.5)
+                self.fill_rect(start, row, int(right + 0.5) - start, 1, color)
+
+    def text(self, x: int, y: int, text: str, color: Color = BLACK, scale: int = 1, align: str = 'left'):
+        """Надпись растровым шрифтом; строчные буквы выводятся заглавными, неизвестные знаки - '?'"""
+        text = text.upper().translate(_LATIN_ALIASES)
+        if align == 'center':
+            x -= text_width(text, scale) // 2
+        elif align == 'right':
+            x -= text_width(text, scale)
+        advance = (GLYPH_WIDTH + 1) * scale
+        for char in text:
+            glyph = _FONT.get(char) or _FONT['?']
+            for row, runs in enumerate(glyph):
+                for start, length in runs:
+                    self.fill_rect(x + start * scale, y + row * scale, length * scale, scale, color)
+            x += advance
+
+    def lines(self, x: int, y: int, lines: Iterable[str], color: Color = BLACK, scale: int = 1, align: str = 'left'):
+        """Несколько строк текста друг под другом"""
+        for line in lines:
+            self.text(x, y, line, color, scale, align)
+            y += (GLYPH_HEIGHT + 3) * scale
+
+    def to_png(self, level: int = 6) -> bytes:
+        """Закодировать холст в PNG (RGB, 8 бит, без фильтров строк)"""
+        stride = self.width * 3
+        raw = b''.join(
+            b'\x00' + self.pixels[offset:offset + stride]
+            for offset in range(0, len(self.pixels), stride)
+        )
+        header = struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)
+        return (
+            b'\x89PNG\r\n\x1a\n'
+            + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(raw, level))
+            + _png_chunk(b'IEND', b'')
+        )
@@ -0,0 +1,155 @@
+import math
+from typing import Sequence, Tuple
+from utils.raster import Canvas, Color, GLYPH_HEIGHT, text_width
+
+# Цвета совпадают с графиками matplotlib (прозрачность уже наложена на белый фон)
+WATER_COLOR: Color = (173, 216, 230)
+CALORIES_COLOR: Color = (255, 192, 76)
+GOAL_COLOR: Color = (255, 128, 128)
+GOAL_TEXT_COLOR: Color = (200, 30, 30)
+AXIS_COLOR: Color = (60, 60, 60)
+GRID_COLOR: Color = (232, 232, 232)
+MACRO_LABELS = ('Белки', 'Углеводы', 'Жиры')
+MACRO_COLORS: Tuple[Color, ...] = ((144, 238, 144), (255, 215, 0), (240, 128, 128))
+
+Box = Tuple[int, int, int, int]
+
+def _tick_step(top: float) -> float:
+    """Шаг делений оси: 1, 2 или 5 на степень десяти, около пяти делений"""
+    raw = top / 5
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for multiplier in (1, 2, 5):
+        if raw <= multiplier * magnitude:
+            return multiplier * magnitude
+    return 10 * magnitude
+
+def _draw_title(canvas: Canvas, box: Box, title: str):
+    x0, y0, x1, _ = box
+    canvas.text((x0 + x1) // 2, y0 + 10, title, scale=2, align='center')
+
+def _draw_empty(canvas: Canvas, box: Box, text: str):
+    x0, y0, x1, y1 = box
+    lines = text.split('\n')
+    height = len(lines) * (GLYPH_HEIGHT + 3) * 2
+    canvas.lines((x0 + x1) // 2, (y0 + y1 - height) // 2, lines, scale=2, align='center')
+
+def _draw_bars(canvas: Canvas, box: Box, title: str, color: Color, empty_text: str,
+               goal_legend: bool, labels: Sequence[str], values: Sequence[float], goal):
+    """Столбчатая диаграмма в прямоугольнике box: столбцы, сетка, линия цели и подписи дат"""
+    _draw_title(canvas, box, title)
+    x0, y0, x1, y1 = box
+    if not labels:
+        _draw_empty(canvas, box, empty_text)
+        return
+
+    has_goal = isinstance(goal, (int, float)) and goal > 0
+    top = max(max(values, default=0), goal if has_goal else 0)
+    top = top * 1.1 if top > 0 else 1
+    step = _tick_step(top)
+    ticks = [step * i for i in range(int(top / step) + 1)]
+    tick_labels = [f'{tick:g}' for tick in ticks]
+
+    left = x0 + 14 + max(text_width(label, 2) for label in tick_labels)
+    right, plot_top, bottom = x1 - 16, y0 + 40, y1 - 32
+    plot_height = bottom - plot_top
+
+    def y_of(value: float) -> int:
+        return bottom - int(value / top * plot_height)
+
+    for tick, label in zip(ticks, tick_labels):
+        y = y_of(tick)
+        canvas.hline(left, right, y, GRID_COLOR)
+        canvas.text(left - 6, y - GLYPH_HEIGHT, label, AXIS_COLOR, scale=2, align='right')
+
+    slot = (right - left) / len(labels)
+    label_scale = 2 if max(text_width(label, 2) for label in labels) < slot - 4 else 1
+    for index, (label, value) in enumerate(zip(labels, values)):
+        center = left + slot * (index + 0.5)
+        bar_top = y_of(value)
+        canvas.fill_rect(int(center - slot * 0.4), bar_top, int(slot * 0.8), bottom - bar_top, color)
+        canvas.text(int(center), bottom + 8, label, AXIS_COLOR, scale=label_scale, align='center')
+
+    if has_goal:
+        canvas.hline(left, right, y_of(goal), GOAL_COLOR, width=2, dash=8)
+        if goal_legend:
+            canvas.text(left + 8, plot_top + 4, f'Цель: {goal:g} ккал', GOAL_TEXT_COLOR, scale=2)
+
+    canvas.vline(left, plot_top, bottom + 1, AXIS_COLOR)
+    canvas.hline(left, right, bottom, AXIS_COLOR)
+
+def _draw_pie(canvas: Canvas, box: Box, sizes: Sequence[float],
+              empty_text: str = 'Нет данных\nо макронутриентах'):
+    """Круговая диаграмма БЖУ с легендой (справа в широком прямоугольнике, иначе снизу)"""
+    x0, y0, x1, y1 = box
+    slices = [(label, size, color) for label, size, color in zip(MACRO_LABELS, sizes, MACRO_COLORS) if size > 0]
+    if not slices:
+        _draw_empty(canvas, box, empty_text)
+        return
+    _draw_title(canvas, box, 'Макронутриенты')
+
+    total = sum(size for _, size, _ in slices)
+    legend = [f'{label} {size / total * 100:.1f}%' for label, size, _ in slices]
+    legend_width = 24 + max(text_width(line, 2) for line in legend)
+    legend_height = len(legend) * 26
+
+    top = y0 + 40
+    wide = (x1 - x0) > 1.5 * (y1 - top)
+    if wide:
+        radius = (y1 - top) // 2 - 16
+        cx = x0 + (x1 - x0 - legend_width) // 2
+        cy = top + (y1 - top) // 2
+        legend_x, legend_y = cx + radius + 40, cy - legend_height // 2
+    else:
+        radius = min(x1 - x0, y1 - top - legend_height) // 2 - 16
+        cx = (x0 + x1) // 2
+        cy = top + 8 + radius
+        legend_x, legend_y = cx - legend_width // 2, cy + radius + 16
+
+    # Как в matplotlib: от 90 градусов против часовой стрелки
+    angle = math.pi / 2
+    for _, size, color in slices:
+        sweep = size / total * 2 * math.pi
+        steps = max(2, int(math.degrees(sweep) / 3))
+        points = [(cx, cy)]
+        for step in range(steps + 1):
+            a = angle + sweep * step / steps
+            points.append((cx + radius * math.cos(a), cy - radius * math.sin(a)))
+        canvas.fill_polygon(points, color)
+        angle += sweep
+
+    for index, (line, (_, _, color)) in enumerate(zip(legend, slices)):
+        y = legend_y + index * 26
+        canvas.fill_rect(legend_x, y, 16, 16, color)
+        canvas.text(legend_x + 24, y + 1, line, scale=2)
+
+def _bars_args(kind: str) -> tuple:
+    if kind == 'water':
+        return 'Потребление воды, мл', WATER_COLOR, 'Нет данных о воде', False
+    return 'Потребление калорий', CALORIES_COLOR, 'Нет данных о калориях', True
+
+def _bar_chart(kind: str, labels: Sequence[str], values: Sequence[float], goal) -> bytes:
+    canvas = Canvas(640, 320)
+    _draw_bars(canvas, (0, 0, 640, 320), *_bars_args(kind), labels, values, goal)
+    return canvas.to_png()
+
+def _pie_chart(*macros) -> bytes:
+    canvas = Canvas(480, 480)
+    _draw_pie(canvas, (0, 0, 480, 480), *macros)
+    return canvas.to_png()
+
+def _dashboard(water: tuple, calories: tuple, macros: tuple) -> bytes:
+    canvas = Canvas(960, 800)
+    _draw_bars(canvas, (0, 0, 480, 400), *_bars_args('water'), *water)
+    _draw_bars(canvas, (480, 0, 960, 400), *_bars_args('calories'), *calories)
+    _draw_pie(canvas, (0, 400, 960, 800), *macros)
+    return canvas.to_png()
+
+def render(kind: str, *args) -> bytes:
+    """Отрисовать график без matplotlib (аргументы те же, что у utils.mpl_charts.render)"""
+    if kind in ('water', 'calories'):
+        return _bar_chart(kind, *args)
+    if kind == 'macros':
+        return _pie_chart(*args)
+    if kind == 'dashboard':
+        return _dashboard(*args)
+    raise ValueError(f"Неизвестный тип графика: {kind}")
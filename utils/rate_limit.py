@@ -0,0 +1,44 @@
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Ведро токенов: в среднем rate операций в секунду, подряд - не больше capacity
+
+    Время передается явно (now), чтобы планировщик мог проверять много ведер
+    на один момент времени; по умолчанию берется time.monotonic().
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: Optional[float]) -> float:
+        now = time.monotonic() if now is None else now
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        return now
+
+    def delay(self, cost: float = 1, now: Optional[float] = None) -> float:
+        """Через сколько секунд можно потратить cost токенов (0 - уже можно)"""
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float = 1, now: Optional[float] = None):
+        """Потратить токены (при нехватке уходит в долг, который вернется со временем)"""
+        self._refill(now)
+        self.tokens -= min(cost, self.capacity)
+
+    def pause(self, seconds: float, now: Optional[float] = None):
+        """Не давать токенов ближайшие seconds секунд (например, после ответа 429)"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self, now: Optional[float] = None) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
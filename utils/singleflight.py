@@ -0,0 +1,31 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Объединение одновременных одинаковых запросов в один"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats: Dict[str, int] = {'calls': 0, 'executed': 0, 'coalesced': 0}
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Выполнить func(*args) или дождаться уже идущего вызова с тем же ключом"""
+        self.stats['calls'] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats['executed'] += 1
+            task = asyncio.ensure_future(func(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats['coalesced'] += 1
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Счетчики вызовов"""
+        return {**self.stats, 'inflight': len(self._inflight)}
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from typing import Awaitable, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class StartupProfiler:
+    """Замер этапов запуска: импорты, startup-хуки и фоновый прогрев"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.ready_at = None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def record(self, name: str, seconds: float):
+        self.phases.append((name, seconds * 1000))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Замерить блок кода как этап запуска"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str, hook: Callable[[], Awaitable]) -> Callable[[], Awaitable]:
+        """Обернуть асинхронный хук, чтобы замерить его время"""
+        async def wrapper():
+            with self.phase(name):
+                return await hook()
+        wrapper.__name__ = getattr(hook, '__name__', name)
+        return wrapper
+
+    async def mark_ready(self):
+        """Последний startup-хук: бот начинает принимать обновления"""
+        self.ready_at = self.elapsed_ms()
+        logger.info(f"Бот готов к приему обновлений за {self.ready_at:.0f} мс")
+
+    def report(self) -> str:
+        lines = [f"{'этап':<40}{'мс':>10}"]
+        lines += [f"{name:<40}{ms:>10.1f}" for name, ms in self.phases]
+        if self.ready_at is not None:
+            lines.append(f"{'готов к приему обновлений':<40}{self.ready_at:>10.1f}")
+        return '\n'.join(lines)
+
+def import_times(statement: str = 'import bot', top: int = 20) -> List[Tuple[str, float, float]]:
+    """Самые долгие импорты кода по -X importtime: (модуль, собственное мс, суммарное мс)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:top]
+
+def format_import_times(rows: List[Tuple[str, float, float]]) -> str:
+    lines = [f"{'модуль':<50}{'свое мс':>10}{'всего мс':>10}"]
+    lines += [f"{name:<50}{own:>10.1f}{total:>10.1f}" for name, own, total in rows]
+    return '\n'.join(lines)
+
+profiler = StartupProfiler()
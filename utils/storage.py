@@ -1,14 +1,298 @@
+import json
+import asyncio
 import logging
-from datetime import datetime, date
-from typing import Dict, Optional
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set
+
+from config import config
+from utils.backends import StorageBackend, create_backend
+from utils.journal import EventJournal
+from utils.locks import StripedLock
+from utils.timeseries import DailySeries, WorkoutIndex, json_default
 
 logger = logging.getLogger(__name__)
 
 class UserStorage:
     """Класс для хранения данных пользователей"""
     
-    def __init__(self):
+    def __init__(self, backend: Optional[StorageBackend] = None):
         self.users: Dict[int, Dict] = {}
+        self.backend = backend or StorageBackend()
+        self._dirty: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.journal: Optional[EventJournal] = None
+        self._replaying = False
+        self._change_listeners: List[Callable[[int], None]] = []
+        self._locks = StripedLock(config.USER_LOCK_STRIPES)
+    
+    def lock(self, user_id: int) -> asyncio.Lock:
+        """Блокировка пользователя для чтения-изменения-записи, в которой есть await:
+
+            async with storage.lock(user_id):
+                user_data = storage.get_user(user_id)
+                ... await ...
+                storage.update_user(user_id, ...)
+
+        Методы хранилища без await внутри (add_water, increment и т.д.) атомарны и без нее.
+        """
+        return self._locks(user_id)
+    
+    async def start(self, backend: Optional[StorageBackend] = None):
+        """Загрузить пользователей из хранилища и запустить фоновую запись"""
+        if config.STORAGE_BACKEND == 'journal':
+            await self._start_journal()
+        else:
+            if backend is None:
+                backend = create_backend(config.STORAGE_BACKEND, config.STORAGE_DB)
+            self.backend = backend
+            
+            users = await asyncio.to_thread(self.backend.load_all)
+            for user_data in users.values():
+                self.restore_user(user_data)
+            self.users.update(users)
+            logger.info(f"Загружено пользователей: {len(users)}")
+        
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def _start_journal(self):
+        """Восстановить состояние из снимка и хвоста журнала"""
+        self.journal = EventJournal(config.JOURNAL_DIR, json_default=json_default)
+        users, events = await asyncio.to_thread(self.journal.recover)
+        for user_data in users.values():
+            self.restore_user(user_data)
+        self.users.update(users)
+        
+        self._replaying = True
+        try:
+            for event in events:
+                self._replay(event)
+        finally:
+            self._replaying = False
+        logger.info(f"Загружено пользователей: {len(self.users)}")
+    
+    async def close(self):
+        """Остановить фоновую запись, сохранить несохраненное и закрыть хранилище"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        await asyncio.to_thread(self.backend.close)
+        if self.journal is not None:
+            await self._snapshot()
+            self.journal.close()
+            self.journal = None
+    
+    def add_change_listener(self, callback: Callable[[int], None]):
+        """Подписаться на изменения данных пользователей (callback(user_id))"""
+        self._change_listeners.append(callback)
+    
+    def _mark_dirty(self, user_id: int):
+        """Отметить пользователя для записи в хранилище"""
+        self._dirty.add(user_id)
+        for callback in self._change_listeners:
+            callback(user_id)
+    
+    @staticmethod
+    def empty_totals() -> Dict[str, float]:
+        """Пустые дневные итоги"""
+        return {
+            'calories': 0,
+            'protein': 0,
+            'carbs': 0,
+            'fat': 0,
+            'food_count': 0,
+            'workout_minutes': 0,
+            'workout_calories': 0,
+            'extra_water': 0,
+            'workout_count': 0
+        }
+    
+    @staticmethod
+    def _add_food_totals(totals: Dict, food_entry: Dict):
+        totals['calories'] += food_entry.get('calories', 0)
+        totals['protein'] += food_entry.get('protein', 0)
+        totals['carbs'] += food_entry.get('carbs', 0)
+        totals['fat'] += food_entry.get('fat', 0)
+        totals['food_count'] += 1
+    
+    @staticmethod
+    def _add_workout_totals(totals: Dict, workout_entry: Dict):
+        totals['workout_minutes'] += workout_entry.get('duration', 0)
+        totals['workout_calories'] += workout_entry.get('calories', 0)
+        totals['extra_water'] += workout_entry.get('additional_water', 0)
+        totals['workout_count'] += 1
+    
+    @staticmethod
+    def restore_user(user_data: Dict) -> Dict:
+        """Восстановить историю из JSON (в т.ч. из старых форматов calorie_history и т.п.)"""
+        history = user_data.get('history')
+        if isinstance(history, dict):
+            user_data['history'] = DailySeries.from_dict(history)
+        elif not isinstance(history, DailySeries):
+            user_data['history'] = DailySeries.from_legacy(user_data)
+        for legacy_key in ('calorie_history', 'burned_history', 'water_history'):
+            user_data.pop(legacy_key, None)
+        
+        workout_index = user_data.get('workout_index')
+        if not isinstance(workout_index, WorkoutIndex):
+            workout_index = WorkoutIndex.from_dict(workout_index) if isinstance(workout_index, dict) else WorkoutIndex()
+            # Тренировки текущего дня - объекты из workout_log, а не их копии из индекса
+            # (в индексе за сегодня могут быть и тренировки до /reset_day, их в журнале уже нет)
+            today = user_data.get('day_started') or UserStorage.local_day(UserStorage.utc_offset(user_data))
+            workout_log = user_data.get('workout_log', [])
+            earlier = [workout for workout in workout_index.get_day(today) if workout not in workout_log]
+            workout_index.set_day(today, earlier + workout_log)
+            user_data['workout_index'] = workout_index
+        
+        if 'daily_totals' not in user_data:
+            totals = UserStorage.empty_totals()
+            for food_entry in user_data.get('food_log', []):
+                UserStorage._add_food_totals(totals, food_entry)
+            for workout_entry in user_data.get('workout_log', []):
+                UserStorage._add_workout_totals(totals, workout_entry)
+            user_data['daily_totals'] = totals
+        return user_data
+    
+    @staticmethod
+    def copy_user(user_data: Dict) -> Dict:
+        """Копия данных пользователя для сериализации в другом потоке
+
+        Копируются изменяемые контейнеры верхнего уровня; записи журналов питания
+        и тренировок после добавления не меняются и общие с оригиналом.
+        """
+        copy = dict(user_data)
+        for key, value in user_data.items():
+            if isinstance(value, (list, dict, DailySeries, WorkoutIndex)):
+                copy[key] = value.copy()
+        return copy
+    
+    @staticmethod
+    def utc_offset(user_data: Dict) -> int:
+        """Смещение пользователя от UTC в секундах"""
+        offset = user_data.get('utc_offset')
+        return config.DEFAULT_UTC_OFFSET if offset is None else int(offset)
+    
+    @staticmethod
+    def local_day(offset: int, now: Optional[datetime] = None) -> date:
+        """Текущая дата по местному времени"""
+        now = now or datetime.now(timezone.utc)
+        return (now + timedelta(seconds=offset)).date()
+    
+    def today(self, user_id: int) -> str:
+        """Ключ текущего дня пользователя в истории: день, начатый DayRollover, иначе местная дата"""
+        user_data = self.users.get(user_id) or {}
+        return user_data.get('day_started') or self.local_day(self.utc_offset(user_data)).isoformat()
+    
+    def _history(self, user_id: int) -> DailySeries:
+        """Дневная история пользователя"""
+        user_data = self.users[user_id]
+        if not isinstance(user_data.get('history'), DailySeries):
+            self.restore_user(user_data)
+        return user_data['history']
+    
+    def _workout_index(self, user_id: int) -> WorkoutIndex:
+        """Индекс тренировок пользователя по дням"""
+        user_data = self.users[user_id]
+        if not isinstance(user_data.get('workout_index'), WorkoutIndex):
+            self.restore_user(user_data)
+        return user_data['workout_index']
+    
+    def get_workouts_between(self, user_id: int, start, end) -> List:
+        """Тренировки пользователя за период [start, end] как список (дата, тренировка)"""
+        if user_id not in self.users:
+            return []
+        return self._workout_index(user_id).between(start, end)
+    
+    def get_daily_totals(self, user_id: int) -> Dict[str, float]:
+        """Итоги за день (питание и тренировки), поддерживаются при каждой записи"""
+        user_data = self.users.get(user_id)
+        if not user_data:
+            return self.empty_totals()
+        if 'daily_totals' not in user_data:
+            self.restore_user(user_data)
+        return user_data['daily_totals']
+    
+    def _record(self, op: str, user_id: int, **fields):
+        """Записать событие в журнал (если журнал включен)"""
+        if self.journal is not None and not self._replaying:
+            self.journal.append(op, user_id=user_id, **fields)
+    
+    def _replay(self, event: Dict):
+        """Применить событие из журнала при восстановлении"""
+        op = event['op']
+        user_id = event['user_id']
+        if op == 'create_user':
+            self.create_user(user_id, event['data'])
+        elif op == 'update_user':
+            self.update_user(user_id, event['updates'])
+        elif op == 'add_food':
+            self.add_food(user_id, event['entry'], today=event['day'])
+        elif op == 'increment':
+            self.increment(user_id, event['field'], event['amount'])
+        elif op == 'add_water':
+            self.add_water(user_id, event['amount'], today=event['day'])
+        elif op == 'add_workout':
+            self.add_workout(user_id, event['entry'], today=event['day'])
+        elif op == 'reset_daily_data':
+            self.reset_daily_data(user_id, today=event['day'])
+        else:
+            logger.warning(f"Неизвестное событие в журнале: {op}")
+    
+    async def flush(self):
+        """Записать измененных пользователей одной транзакцией вне цикла событий"""
+        if self.journal is not None:
+            await self.journal.flush()
+            if self.journal.events_since_snapshot >= config.JOURNAL_SNAPSHOT_EVERY:
+                await self._snapshot()
+            # Изменения уже в журнале, а хранилище в этом режиме ничего не пишет
+            self._dirty.clear()
+            return
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        # В цикле событий - только дешевые копии, порциями (смена дня помечает целую группу);
+        # JSON строится в потоке. Изменившийся после копирования пользователь снова в _dirty.
+        users = []
+        for user_id in dirty:
+            user_data = self.users.get(user_id)
+            if user_data is not None:
+                users.append((user_id, self.copy_user(user_data)))
+                if len(users) % config.STORAGE_FLUSH_CHUNK == 0:
+                    await asyncio.sleep(0)
+        try:
+            await asyncio.to_thread(self._save, users)
+        except Exception as e:
+            logger.error(f"Ошибка записи в хранилище: {e}")
+            self._dirty |= dirty
+    
+    async def _snapshot(self):
+        """Снимок журнала: копии пользователей порциями, с seq журнала на момент копирования"""
+        seq = self.journal.seq
+        users, user_seqs = {}, {}
+        for user_id in list(self.users):
+            user_data = self.users.get(user_id)
+            if user_data is None:
+                continue
+            users[user_id] = self.copy_user(user_data)
+            user_seqs[user_id] = self.journal.seq
+            if len(users) % config.STORAGE_FLUSH_CHUNK == 0:
+                await asyncio.sleep(0)
+        await self.journal.snapshot(users, user_seqs, seq)
+    
+    def _save(self, users: List):
+        rows = [
+            (user_id, json.dumps(user_data, ensure_ascii=False, default=json_default))
+            for user_id, user_data in users
+        ]
+        self.backend.save_many(rows)
+    
+    async def _flush_loop(self):
+        """Групповая запись изменений раз в STORAGE_FLUSH_INTERVAL_MS"""
+        while True:
+            await asyncio.sleep(config.STORAGE_FLUSH_INTERVAL_MS / 1000)
+            await self.flush()
     
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Получить данные пользователя"""
@@ -22,31 +306,63 @@ class UserStorage:
             'logged_calories': 0,
             'burned_calories': 0,
             'food_log': [],
-            'workout_log': []
+            'workout_log': [],
+            'history': DailySeries(),
+            'workout_index': WorkoutIndex(),
+            'daily_totals': self.empty_totals()
         }
+        self._mark_dirty(user_id)
+        self._record('create_user', user_id, data=user_data)
+    
+    def _apply(self, user_id: int, updates: Dict):
+        self.users[user_id].update(updates)
+        self._mark_dirty(user_id)
     
     def update_user(self, user_id: int, updates: Dict):
         """Обновить данные пользователя"""
         if user_id in self.users:
-            self.users[user_id].update(updates)
+            self._apply(user_id, updates)
+            self._record('update_user', user_id, updates=updates)
+    
+    def increment(self, user_id: int, field: str, amount: float = 1) -> Optional[float]:
+        """Атомарно увеличить числовое поле пользователя, вернуть новое значение"""
+        user_data = self.users.get(user_id)
+        if user_data is None:
+            return None
+        value = user_data.get(field, 0) + amount
+        self._apply(user_id, {field: value})
+        self._record('increment', user_id, field=field, amount=amount)
+        return value
+    
+    def add_water(self, user_id: int, amount: float, today: Optional[str] = None) -> float:
+        """Добавить выпитую воду, вернуть итог за день"""
+        if user_id not in self.users:
+            return 0
+        today = today or self.today(user_id)
+        total = self.users[user_id].get('logged_water', 0) + amount
+        self._apply(user_id, {'logged_water': total})
+        self._history(user_id).set(today, 'water', total)
+        self._record('add_water', user_id, amount=amount, day=today)
+        return total
     
-    def add_food(self, user_id: int, food_entry: Dict):
+    def add_food(self, user_id: int, food_entry: Dict, today: Optional[str] = None):
         """Добавить еду"""
         if user_id in self.users:
-            today = date.today().isoformat()
+            today = today or self.today(user_id)
             
             food_log = self.users[user_id].get('food_log', [])
             food_log.append(food_entry)
             
+            self._add_food_totals(self.get_daily_totals(user_id), food_entry)
+            
             current_calories = self.users[user_id].get('logged_calories', 0) + food_entry['calories']
-            calorie_history = self.users[user_id].get('calorie_history', {})
-            calorie_history[today] = current_calories
+            self._history(user_id).set(today, 'calories', current_calories)
             
-            self.update_user(user_id, {
+            self._apply(user_id, {
                 'logged_calories': current_calories,
-                'food_log': food_log,
-                'calorie_history': calorie_history
+                'food_log': food_log
             })
+            self._record('add_food', user_id, entry=food_entry, day=today)
 
 
     def update_water_goal_with_workouts(self, user_id: int, calculator):
@@ -65,16 +381,10 @@ class UserStorage:
             temperature=temperature
         )
         
-        # Суммируем дополнительную воду за все сегодняшние тренировки
-        total_additional_water = 0
-        today = datetime.now().strftime('%Y-%m-%d')
-        
-        for workout in user_data.get('workout_log', []):
-            workout_date = workout.get('date', '')
-            if today in workout_date:  
-                total_additional_water += workout.get('additional_water', 0)
+        # Дополнительная вода за все сегодняшние тренировки (из индекса по дням)
+        total_additional_water = self._workout_index(user_id).get_extra_water(self.today(user_id))
         
-        new_water_goal = base_water_goal + total_additional_water
+        new_water_goal = round(base_water_goal + total_additional_water)
         
         self.update_user(user_id, {
             'water_goal': new_water_goal,
@@ -83,33 +393,25 @@ class UserStorage:
         
         return new_water_goal
 
-    def add_workout(self, user_id: int, workout_entry: Dict):
+    def add_workout(self, user_id: int, workout_entry: Dict, today: Optional[str] = None):
         """Добавить тренировку"""
         if user_id in self.users:
-            today = datetime.now().strftime('%Y-%m-%d')
+            today = today or self.today(user_id)
             
             current_burned = self.users[user_id].get('burned_calories', 0) + workout_entry['calories']
             
             workout_log = self.users[user_id].get('workout_log', [])
             workout_log.append(workout_entry)
             
-            burned_history = self.users[user_id].get('burned_history', [])
-            
-            found = False
-            for entry in burned_history:
-                if entry.get('date') == today:
-                    entry['calories'] = current_burned
-                    found = True
-                    break
+            self._history(user_id).set(today, 'burned', current_burned)
+            self._add_workout_totals(self.get_daily_totals(user_id), workout_entry)
+            self._workout_index(user_id).add(today, workout_entry)
             
-            if not found:
-                burned_history.append({'date': today, 'calories': current_burned})
-            
-            self.update_user(user_id, {
+            self._apply(user_id, {
                 'burned_calories': current_burned,
-                'workout_log': workout_log,
-                'burned_history': burned_history
+                'workout_log': workout_log
             })
+            self._record('add_workout', user_id, entry=workout_entry, day=today)
         
     def get_daily_progress(self, user_id: int) -> Dict:
         """Получить дневной прогресс"""
@@ -146,34 +448,28 @@ class UserStorage:
             }
         }
     
-    def reset_daily_data(self, user_id: int):
+    def reset_daily_data(self, user_id: int, today: Optional[str] = None):
         """Сбросить дневные данные"""
         if user_id in self.users:
             # Сохраняем историю
-            today = date.today().isoformat()
-            
-            self.users[user_id]['water_history'].append({
-                'date': today,
-                'amount': self.users[user_id]['logged_water']
-            })
+            today = today or self.today(user_id)
             
-            self.users[user_id]['calorie_history'].append({
-                'date': today,
-                'calories': self.users[user_id]['logged_calories']
-            })
-            
-            self.users[user_id]['burned_history'].append({
-                'date': today,
-                'calories': self.users[user_id]['burned_calories']
-            })
+            history = self._history(user_id)
+            history.set(today, 'water', self.users[user_id]['logged_water'])
+            history.set(today, 'calories', self.users[user_id]['logged_calories'])
+            history.set(today, 'burned', self.users[user_id]['burned_calories'])
             
             # Сбрасываем текущие значения
             self.users[user_id]['logged_water'] = 0
             self.users[user_id]['logged_calories'] = 0
             self.users[user_id]['burned_calories'] = 0
             self.users[user_id]['food_log'] = []
+            # Тренировки за день остаются в индексе, старые дни отбрасываются
+            self._workout_index(user_id).prune(DailySeries.to_ordinal(today) - config.WORKOUT_HISTORY_DAYS)
             self.users[user_id]['workout_log'] = []
+            self.users[user_id]['daily_totals'] = self.empty_totals()
             
-            self.save_to_file()
+            self._mark_dirty(user_id)
+            self._record('reset_daily_data', user_id, day=today)
 
 storage = UserStorage()
\ No newline at end of file
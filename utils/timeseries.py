@@ -0,0 +1,232 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, List, Tuple, Union
+
+DayLike = Union[date, str, int]
+
+class DailySeries:
+    """Дневная история пользователя в колонках: порядковый номер дня + array('d') на метрику
+
+    Запись за сегодня (последний день) обновляется за O(1),
+    выборка по диапазону дат - бинарным поиском за O(log n).
+    """
+
+    METRICS = ('water', 'calories', 'burned')
+
+    def __init__(self):
+        self.days = array('i')
+        self.columns: Dict[str, array] = {metric: array('d') for metric in self.METRICS}
+
+    @staticmethod
+    def to_ordinal(day: DayLike) -> int:
+        if isinstance(day, int):
+            return day
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        return day.toordinal()
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def _row(self, day: DayLike) -> int:
+        """Индекс строки для дня (создается при отсутствии)"""
+        ordinal = self.to_ordinal(day)
+        if self.days and self.days[-1] == ordinal:
+            return len(self.days) - 1
+        if not self.days or self.days[-1] < ordinal:
+            self.days.append(ordinal)
+            for column in self.columns.values():
+                column.append(0.0)
+            return len(self.days) - 1
+
+        index = bisect_left(self.days, ordinal)
+        if self.days[index] != ordinal:
+            self.days.insert(index, ordinal)
+            for column in self.columns.values():
+                column.insert(index, 0.0)
+        return index
+
+    def set(self, day: DayLike, metric: str, value: float):
+        """Записать значение метрики за день"""
+        self.columns[metric][self._row(day)] = value
+
+    def add(self, day: DayLike, metric: str, delta: float) -> float:
+        """Прибавить к значению метрики за день, вернуть новое значение"""
+        row = self._row(day)
+        self.columns[metric][row] += delta
+        return self.columns[metric][row]
+
+    def get(self, day: DayLike, metric: str, default: float = 0.0) -> float:
+        """Значение метрики за день"""
+        ordinal = self.to_ordinal(day)
+        index = bisect_left(self.days, ordinal)
+        if index < len(self.days) and self.days[index] == ordinal:
+            return self.columns[metric][index]
+        return default
+
+    def copy(self) -> 'DailySeries':
+        """Независимая копия (массивы копируются целиком, без поэлементного обхода)"""
+        series = DailySeries.__new__(DailySeries)
+        series.days = self.days[:]
+        series.columns = {metric: column[:] for metric, column in self.columns.items()}
+        return series
+
+    def _slice(self, start: int, stop: int) -> Tuple[List[date], Dict[str, List[float]]]:
+        dates = [date.fromordinal(ordinal) for ordinal in self.days[start:stop]]
+        return dates, {metric: column[start:stop].tolist() for metric, column in self.columns.items()}
+
+    def range(self, start: DayLike, end: DayLike) -> Tuple[List[date], Dict[str, List[float]]]:
+        """Даты и значения метрик за период [start, end]"""
+        lo = bisect_left(self.days, self.to_ordinal(start))
+        hi = bisect_right(self.days, self.to_ordinal(end))
+        return self._slice(lo, hi)
+
+    def last(self, n: int) -> Tuple[List[date], Dict[str, List[float]]]:
+        """Даты и значения метрик за последние n дней с данными"""
+        return self._slice(max(0, len(self.days) - n), len(self.days))
+
+    def to_dict(self) -> Dict:
+        """Представление для JSON"""
+        return {
+            'days': self.days.tolist(),
+            **{metric: column.tolist() for metric, column in self.columns.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DailySeries':
+        series = cls()
+        series.days = array('i', data.get('days', []))
+        for metric in cls.METRICS:
+            values = data.get(metric) or [0.0] * len(series.days)
+            series.columns[metric] = array('d', values)
+        return series
+
+    @classmethod
+    def from_legacy(cls, user_data: Dict) -> 'DailySeries':
+        """Перенести старые calorie_history / burned_history / water_history в одну серию"""
+        series = cls()
+        sources = (
+            ('calories', user_data.get('calorie_history'), 'calories'),
+            ('burned', user_data.get('burned_history'), 'calories'),
+            ('water', user_data.get('water_history'), 'amount')
+        )
+        for metric, history, value_key in sources:
+            if isinstance(history, dict):
+                items = history.items()
+            elif isinstance(history, list):
+                items = [
+                    (entry.get('date'), entry.get(value_key, 0))
+                    for entry in history if isinstance(entry, dict) and entry.get('date')
+                ]
+            else:
+                continue
+            for day, value in items:
+                try:
+                    series.set(day, metric, float(value))
+                except (TypeError, ValueError):
+                    continue
+        return series
+
+class WorkoutIndex:
+    """Индекс тренировок по дням: день -> список тренировок и сумма доп. воды за день
+
+    Хранится вместе с history и переживает смену дня (workout_log очищается, прошлые
+    дни остаются только в индексе). Тренировки текущего дня при загрузке берутся из
+    workout_log, чтобы в памяти это были те же объекты. Дни старше
+    WORKOUT_HISTORY_DAYS отбрасываются при смене дня.
+    """
+
+    def __init__(self):
+        self.days = array('i')
+        self.workouts: List[List[Dict]] = []
+        self.extra_water = array('d')
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def _find(self, ordinal: int) -> int:
+        """Индекс дня или -1"""
+        if self.days and self.days[-1] == ordinal:
+            return len(self.days) - 1
+        index = bisect_left(self.days, ordinal)
+        if index < len(self.days) and self.days[index] == ordinal:
+            return index
+        return -1
+
+    def add(self, day: DayLike, workout_entry: Dict) -> float:
+        """Добавить тренировку, вернуть доп. воду за этот день"""
+        ordinal = DailySeries.to_ordinal(day)
+        index = self._find(ordinal)
+        if index < 0:
+            index = bisect_left(self.days, ordinal)
+            self.days.insert(index, ordinal)
+            self.workouts.insert(index, [])
+            self.extra_water.insert(index, 0.0)
+        self.workouts[index].append(workout_entry)
+        self.extra_water[index] += workout_entry.get('additional_water', 0)
+        return self.extra_water[index]
+
+    def get_extra_water(self, day: DayLike) -> float:
+        """Дополнительная вода за тренировки в этот день"""
+        index = self._find(DailySeries.to_ordinal(day))
+        return self.extra_water[index] if index >= 0 else 0.0
+
+    def get_day(self, day: DayLike) -> List[Dict]:
+        """Тренировки за день"""
+        index = self._find(DailySeries.to_ordinal(day))
+        return list(self.workouts[index]) if index >= 0 else []
+
+    def between(self, start: DayLike, end: DayLike) -> List[Tuple[date, Dict]]:
+        """Тренировки за период [start, end]"""
+        lo = bisect_left(self.days, DailySeries.to_ordinal(start))
+        hi = bisect_right(self.days, DailySeries.to_ordinal(end))
+        return [
+            (date.fromordinal(self.days[i]), workout)
+            for i in range(lo, hi) for workout in self.workouts[i]
+        ]
+
+    def set_day(self, day: DayLike, workouts: List[Dict]):
+        """Заменить тренировки за день"""
+        ordinal = DailySeries.to_ordinal(day)
+        index = self._find(ordinal)
+        if index >= 0:
+            del self.days[index]
+            del self.workouts[index]
+            del self.extra_water[index]
+        for workout in workouts:
+            self.add(ordinal, workout)
+
+    def prune(self, before: DayLike):
+        """Удалить дни раньше before"""
+        cut = bisect_left(self.days, DailySeries.to_ordinal(before))
+        if cut:
+            del self.days[:cut]
+            del self.workouts[:cut]
+            del self.extra_water[:cut]
+
+    def copy(self) -> 'WorkoutIndex':
+        """Копия для сериализации в другом потоке (сами записи тренировок не меняются)"""
+        index = WorkoutIndex.__new__(WorkoutIndex)
+        index.days = self.days[:]
+        index.workouts = [list(workouts) for workouts in self.workouts]
+        index.extra_water = self.extra_water[:]
+        return index
+
+    def to_dict(self) -> Dict:
+        """Представление для JSON"""
+        return {'days': self.days.tolist(), 'workouts': self.workouts}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'WorkoutIndex':
+        index = cls()
+        for ordinal, workouts in zip(data.get('days', []), data.get('workouts', [])):
+            for workout in workouts:
+                index.add(ordinal, workout)
+        return index
+
+def json_default(obj):
+    """Сериализация DailySeries и WorkoutIndex в json.dumps"""
+    if isinstance(obj, (DailySeries, WorkoutIndex)):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")